@@ -1,94 +1,111 @@
+import sys
+
 from scipy.sparse import coo_matrix
-from scipy.sparse.linalg import spsolve
-from scipy import sparse
+from linear_solvers import solve_placement
+from net_models import net_model_connections, star_positions, bound2bound_connections
 from data_structures import *
-import visualization
 from parser import parser
 from evaluations import summation_of_HPWL
+from legalization import legalize_and_refine
+import instrumentation
 
 
-def solve(net_list, gate_list, pad_list):
-    # net_list, gate_list, pad_list = parser("benchmarks/3QP/test.txt")
-    # # init_coordinate
-    # for i in range(len(gate_list)):
-    #     gate_list[i].coordinate = [random.randint(0, 100), random.randint(0, 100)]
-
-    # 1. make C matrix
-    size = len(gate_list)
-    connected_info = []
-    for i in range(len(net_list)):
-        neighbor_gate_list = net_list[i].connected_gates
-        for j in range(len(neighbor_gate_list)):
-            for k in range(len(neighbor_gate_list)):
-                if j != k:
-                    connected_info.append([neighbor_gate_list[j], neighbor_gate_list[k], 1])
-    del neighbor_gate_list, i, j, k
-    connected_info = np.array(connected_info)
-    connected_info2 = np.array(connected_info[:, 2], dtype=np.float64)
-    connected_info0 = np.array(connected_info[:, 0], dtype=int)
-    connected_info1 = np.array(connected_info[:, 1], dtype=int)
-
-    C = coo_matrix((connected_info2, (connected_info0, connected_info1)))
-    C = C.toarray()
-    C = C[1:, 1:]
-    del connected_info, connected_info0, connected_info1, connected_info2
-
-    # 2. make A matrix
-    A = np.zeros((size, size), dtype=np.float64)
-    A = A + C
-    for i in range(len(gate_list)):
-        A[i][i] = -sum(C[i, :])
-    A = -A
-
-    for i in range(len(pad_list)):
-        net_idx = pad_list[i].connected_net - 1
-        connected_gates = net_list[net_idx].connected_gates
-        for j in range(len(connected_gates)):
-            gate_num = connected_gates[j]
-            A[gate_num - 1][gate_num - 1] += 1
-
-    # 3. get bx and by
-    R = []
-    C = []
-    V = []
-    for i in range(len(pad_list)):
-        pad = pad_list[i]
-        net_idx = pad.connected_net
-        connected_net_i = net_list[net_idx - 1]
-        gate_number = connected_net_i.connected_gates[0]  # this net has only one connection with pad and gate
-        R.append(gate_number)
-        R.append(gate_number)
-        C.append(0)
-        C.append(1)
-        V.append(pad.coordinate[0])
-        V.append(pad.coordinate[1])
-    b = coo_matrix((V, (R, C)), shape=(size + 1, 2))  ## ??? why the size should be plused one
-    b = b.toarray()
-    b = b[1:, :]  # this is bx and by
-    del V, R, C, i, j, net_idx, pad, connected_net_i, gate_number
-
-    # 4. transform numpy array to coo_matrix and get x and y
-    sA = sparse.csr_matrix(A)
-    x_y = spsolve(sA.tocsr(), b)
-    del A, sA, b
-    x = x_y[:, 0]
-    y = x_y[:, 1]
+def solve(net_list, gate_list, pad_list, net_model="clique", fanout_threshold=4, iterations=None, solver="direct",
+          preconditioner="jacobi", tol=1e-6, max_iterations=None, parallel=False, trace=None):
+    # net_model is "clique", "star", "hybrid" (clique up to fanout_threshold pins, star above) or "b2b".
+    # b2b starts from a hybrid solve and then re-solves iterations times (default 5) with Bound2Bound weights
+    # taken from the previous placement.
+    # solver is "direct" (sparse LU) or "cg" (preconditioned conjugate gradient warm-started from the current
+    # coordinates, preconditioner "none", "jacobi", "ssor" or "amg"), see linear_solvers.solve_placement.
+    # trace, a TraceRecorder with the column HPWL, records the HPWL after every solve
+    netlist = netlist_of(gate_list)
+    profiler = instrumentation.get_profiler()
+    if iterations is None:
+        iterations = 5 if net_model == "b2b" else 1
+
+    # 1. connections of the net model, clique, star or a mix of both
+    first_model = "hybrid" if net_model == "b2b" else net_model
+    with profiler.timer("quadratic.assemble"):
+        star_nets, gate_pairs, pad_anchors = net_model_connections(netlist, first_model, fanout_threshold)
+        num_variables = netlist.num_gates + len(star_nets)
+
+        # 2. make A matrix and bx, by directly as sparse matrices
+        A, b = assemble_system(num_variables, gate_pairs, pad_anchors, netlist.pad_xy)
+
+    # 3. get x and y
+    x0 = np.concatenate((netlist.gate_xy, star_positions(netlist, star_nets)))
+    with profiler.timer("quadratic.solve"):
+        x_y = solve_placement(A, b, x0=x0, method=solver, preconditioner=preconditioner, tol=tol,
+                              max_iterations=max_iterations, parallel=parallel)
+    netlist.gate_xy[:] = x_y[:netlist.num_gates]
+    if trace is not None:
+        trace.record(summation_of_HPWL(net_list, gate_list, pad_list))
+
+    # 4. Bound2Bound re-solves, one matrix per dimension
+    if net_model == "b2b":
+        for i in range(iterations):
+            with profiler.timer("quadratic.assemble"):
+                connections_x, connections_y = bound2bound_connections(netlist)
+                A_x, b_x = assemble_system(netlist.num_gates, *connections_x, netlist.pad_xy)
+                A_y, b_y = assemble_system(netlist.num_gates, *connections_y, netlist.pad_xy)
+                b = np.column_stack((b_x[:, 0], b_y[:, 1]))
+            with profiler.timer("quadratic.solve"):
+                x_y = solve_placement((A_x, A_y), b, x0=netlist.gate_xy.copy(), method=solver,
+                                      preconditioner=preconditioner, tol=tol, max_iterations=max_iterations,
+                                      parallel=parallel)
+            netlist.gate_xy[:] = x_y
+            if trace is not None:
+                trace.record(summation_of_HPWL(net_list, gate_list, pad_list))
+    else:
+        # the other models are fixed, more iterations only refine an iterative solve from its warm start
+        for i in range(iterations - 1):
+            x0 = np.concatenate((netlist.gate_xy, x_y[netlist.num_gates:]))
+            with profiler.timer("quadratic.solve"):
+                x_y = solve_placement(A, b, x0=x0, method=solver, preconditioner=preconditioner, tol=tol,
+                                      max_iterations=max_iterations, parallel=parallel)
+            netlist.gate_xy[:] = x_y[:netlist.num_gates]
+            if trace is not None:
+                trace.record(summation_of_HPWL(net_list, gate_list, pad_list))
+    if trace is not None:
+        trace.flush()
+
     for i in range(len(gate_list)):
         gate = gate_list[i]
-        gate.set_coordinate(x_y[i])
-    del gate, i, x_y
+        gate.set_coordinate(netlist.gate_xy[i])
 
     return net_list, gate_list, pad_list
 
 
+def assemble_system(num_variables, gate_pairs, pad_anchors, pad_xy):
+    # A = sum over pairs of w * (e_i - e_j)(e_i - e_j)^T plus w on the diagonal of every gate anchored to a pad,
+    # b = sum over anchors of w * pad coordinate. duplicate entries are summed by the COO -> CSR conversion.
+    i, j, w = gate_pairs
+    g, p, w_pad = pad_anchors
+    diagonal = np.bincount(i, w, num_variables) + np.bincount(j, w, num_variables) \
+        + np.bincount(g, w_pad, num_variables)
+    rows = np.concatenate((i, j, np.arange(num_variables)))
+    cols = np.concatenate((j, i, np.arange(num_variables)))
+    data = np.concatenate((-w, -w, diagonal))
+    A = coo_matrix((data, (rows, cols)), shape=(num_variables, num_variables)).tocsr()
+
+    b = np.zeros((num_variables, 2), dtype=np.float64)
+    b[:, 0] = np.bincount(g, w_pad * pad_xy[p, 0], num_variables)
+    b[:, 1] = np.bincount(g, w_pad * pad_xy[p, 1], num_variables)
+    return A, b
+
+
 def sort_gates(gate_list):
     gate_list = sorted(gate_list, key=lambda gate: gate.benchmark_for_order)
     return gate_list
 
 
-def main():
+def main(headless=False):
     benchmarks = ["benchmarks/toy1", "benchmarks/toy2", "benchmarks/primary1", "benchmarks/fract", "benchmarks/struct",
                   "benchmarks/biomed"]
+    observer = None
+    if not headless:
+        import visualization
+        observer = visualization.renderer(ver="Q")
     for bench_name in benchmarks:
         net_list, gate_list, pad_list = parser(bench_name)
         initial_HPWL = summation_of_HPWL(net_list, gate_list, pad_list)
@@ -97,9 +114,14 @@ def main():
         final_HPWL = summation_of_HPWL(net_list, gate_list, pad_list)
         print("FINAL HPWL of", bench_name, final_HPWL)
         print("delta HPWL of", bench_name, initial_HPWL - final_HPWL)
-        visualization.draw_window(pad_list, gate_list, net_list, ver="Q", information=[bench_name])
+        # the quadratic optimum is clustered far below the slot pitch, so it is spread before legalization
+        result = legalize_and_refine(net_list, gate_list, pad_list, spread=True)
+        print("legalized HPWL of", bench_name, result["legal_HPWL"])
+        print("detailed placement HPWL of", bench_name, result["detailed_HPWL"])
+        if observer is not None:
+            observer(net_list, gate_list, pad_list, information=[bench_name])
         print()
 
 
 if __name__ == "__main__":
-    main()
+    main(headless="--headless" in sys.argv)
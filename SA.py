@@ -1,95 +1,310 @@
 import math
+import sys
 
 import numpy
 import numpy as np
 
-import visualization
-from visualization import print_pads_and_gates
 from data_structures import Gate
 from data_structures import Pad
 from data_structures import Net
 from evaluations import summation_of_HPWL
+from evaluations import IncrementalHPWL
+from evaluations import vectorized_HPWL
+from data_structures import netlist_of
+from move_generator import WindowedMoveGenerator
+from legalization import legalize
+from legalization import SlotGrid
+from netlist_store import open_store
+from netlist_store import write_store
+from annealing_schedule import AnnealingSchedule
+from annealing_schedule import load_checkpoint
+from annealing_schedule import save_checkpoint
+from trace_recorder import TraceRecorder
 import random
 import parser
-import pandas as pd
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import instrumentation
 
 
-def simulated_annealing(net_list, gate_list, pad_list):
+def simulated_annealing(net_list, gate_list, pad_list, observer=None, moves=None, schedule=None,
+                        checkpoint_path=None, trace=None):
+    # observer(net_list, gate_list, pad_list, remark=..., information=[T, HPWL]) is called on every new best HPWL,
+    # e.g. visualization.renderer(ver="SA"); without it nothing is rendered.
+    # moves generates the moves, by default a WindowedMoveGenerator whose range window shrinks with the temperature.
+    # schedule is an AnnealingSchedule (calibrated initial temperature, cooling, moves per temperature, time budget).
+    # with checkpoint_path the state is saved there every schedule.checkpoint_interval seconds and at the end,
+    # and an existing checkpoint is resumed.
+    # trace records the HPWL after every move, by default appended in chunks to HPWL_list_SA.csv
     remark = 0
-    # initializing temperature
-    N = 1
-    T = 0.5
     frozen = False
+    if moves is None:
+        moves = WindowedMoveGenerator(gate_list)
+    if schedule is None:
+        schedule = AnnealingSchedule()
 
-    HPWL_list = []
-
-    HPWL_list.append(summation_of_HPWL(net_list, gate_list, pad_list))
-    HPWL_list_raw = np.array(HPWL_list)
+    resume = checkpoint_path is not None and os.path.exists(checkpoint_path)
+    if trace is None:
+        trace = TraceRecorder(path="HPWL_list_SA.csv", append=resume)
+    if resume:
+        T, HPWL_list = load_checkpoint(checkpoint_path, netlist_of(gate_list).gate_xy, schedule, moves)
+        print("resumed from", checkpoint_path, "at T =", T)
+        hpwl = IncrementalHPWL(net_list, gate_list, pad_list)
+    else:
+        HPWL_list = []
+        HPWL_list.append(summation_of_HPWL(net_list, gate_list, pad_list))
+        hpwl = IncrementalHPWL(net_list, gate_list, pad_list)
+        # initializing temperature
+        T = schedule.calibrate(hpwl, moves)
+        schedule.start()
+        trace.record(HPWL_list[0])
     HPWL_min = np.inf
+    profiler = instrumentation.get_profiler()
     while (not frozen):
-        M = 5  # M is how many swaps per gate
-        for n in range(M * len(gate_list)):
-            L_before = summation_of_HPWL(net_list, gate_list, pad_list)
-
-            # swap 2 random gates Gi and Gj
-            i = random.randint(0, len(gate_list) - 1)
-            j = random.randint(0, len(gate_list) - 1)
-            Gi: Gate = gate_list[i]
-            Gj: Gate = gate_list[j]
-
-            Gi_coordinate = Gi.coordinate
-            Gj_coordinate = Gj.coordinate
-            Gi.coordinate = Gj_coordinate
-            Gj.coordinate = Gi_coordinate
-
-            # compute delta L
-            L_after = summation_of_HPWL(net_list, gate_list, pad_list)
-            delta_L = L_after - L_before
+        temperature_start = time.perf_counter()
+        for n in range(schedule.moves_per_temperature(len(gate_list))):
+            # swap a random gate with a gate in its window, or displace it into an empty slot,
+            # computing delta L only over the nets connected to the moved gates
+            delta_L = moves.propose(hpwl)
+            L_after = hpwl.total + delta_L
 
             if delta_L < 0:
-                # accept this swap
-                pass
+                # accept this move
+                moves.accept(hpwl)
             else:
                 if random.randint(0, 1000) / 1000 < math.exp(- delta_L / T):
-                    pass
-                    # accept this swap
+                    # accept this move
+                    moves.accept(hpwl)
                 else:
-                    # undo uphill swap
-                    Gi.coordinate = Gi_coordinate
-                    Gj.coordinate = Gj_coordinate
-            HPWL_list_raw = numpy.append(HPWL_list_raw, L_after)
+                    # undo uphill move
+                    moves.reject(hpwl)
+            trace.record(L_after)
             remark += 1
 
             # visualization
             if L_after < HPWL_min:
                 HPWL_min = L_after
-                print(L_after)
-                information = []
-                information.append(T)
-                information.append(L_after)
-                visualization.draw_window(pad_list, gate_list, net_list, ver="SA", remark=remark,
-                                          information=information)
+                if observer is not None:
+                    information = []
+                    information.append(T)
+                    information.append(L_after)
+                    observer(net_list, gate_list, pad_list, remark=remark, information=information)
 
+            if n % 1024 == 1023 and schedule.out_of_time():
+                break
 
-        # if HPWL still decreasing over the last few temperatures
+        temperature_time = time.perf_counter() - temperature_start
         HPWL_list.append(summation_of_HPWL(net_list, gate_list, pad_list))
-        if len(HPWL_list) >= 10:
-            if HPWL_list[-4] < HPWL_list[-1]:
-                frozen = True
-        T = 0.9 * T
-        print()
-        print("HPWL_list:", HPWL_list)
+        proposed = moves.proposed
+        accepted = moves.accepted
+        acceptance_rate = moves.adapt()
+        profiler.add_time("SA.temperature", temperature_time)
+        profiler.count("SA.moves", proposed)
+        profiler.count("SA.accepted", accepted)
+        profiler.count("SA.rejected", proposed - accepted)
+        profiler.record("SA", T=T, HPWL=HPWL_list[-1], acceptance_rate=acceptance_rate, window=moves.window,
+                        moves_per_second=proposed / max(temperature_time, 1e-9))
+        T = schedule.next_temperature(T, acceptance_rate)
+        frozen = schedule.frozen(HPWL_list)
+
+        trace.flush()
+        if checkpoint_path is not None and (frozen or schedule.checkpoint_due()):
+            save_checkpoint(checkpoint_path, netlist_of(gate_list).gate_xy, T, HPWL_list, schedule, moves)
+    trace.close()
+    return HPWL_list[-1]
+
+
+def metropolis_moves(hpwl: IncrementalHPWL, moves, T, n_moves, rng=random):
+    # n_moves moves of the move generator at the fixed temperature T, returns how many were accepted
+    accepted = 0
+    for n in range(n_moves):
+        delta_L = moves.propose(hpwl)
+        if delta_L < 0 or rng.random() < math.exp(- delta_L / T):
+            moves.accept(hpwl)
+            accepted += 1
+        else:
+            moves.reject(hpwl)
+    return accepted
+
+
+def sample_move_deltas(hpwl: IncrementalHPWL, moves, samples=200):
+    # delta HPWL of random moves, every move is rolled back again
+    deltas = []
+    for n in range(samples):
+        deltas.append(moves.propose(hpwl))
+        moves.reject(hpwl)
+    return deltas
+
+
+# netlist and slot grid of a parallel tempering worker process, set once by the pool initializer
+_replica = None
+
 
-        N += 1
-        df = pd.DataFrame(HPWL_list_raw)
-        df.to_csv("HPWL_list_SA.csv", index=False)
+def _init_replica_worker(store_path, gate_xy, columns, rows, lower, upper):
+    # the connectivity is mapped read-only from the netlist store, only the coordinates are private to the worker
+    _set_replica(open_store(store_path, gate_xy), columns, rows, lower, upper)
 
 
-def main():
+def _set_replica(netlist, columns, rows, lower, upper):
+    global _replica
+    _replica = netlist.make_lists(), SlotGrid(columns, rows, lower, upper)
+
+
+def _run_replica(task):
+    # a replica is the gate of every slot, the gates are put onto their slots before the moves
+    slot_gate, window, T, n_moves, seed = task
+    (net_list, gate_list, pad_list), grid = _replica
+    grid.occupant[:] = slot_gate
+    rng = random.Random(seed)
+    moves = WindowedMoveGenerator(gate_list, window=window, rng=rng, grid=grid)
+    hpwl = IncrementalHPWL(net_list, gate_list, pad_list)
+    accepted = metropolis_moves(hpwl, moves, T, n_moves, rng)
+    moves.adapt()
+    L, net_HPWL = vectorized_HPWL(netlist_of(gate_list))
+    return grid.occupant.copy(), moves.window, float(L), accepted
+
+
+def parallel_tempering(net_list, gate_list, pad_list, replicas=8, T_max=None, T_min=None, rounds=50,
+                       moves_per_round=None, processes=None, seed=0, grid=None, whitespace=0.2, store_path=None):
+    # replicas chains at temperatures spaced geometrically from T_max down to T_min run in a process pool.
+    # the chains move the gates over the sites of a legalization.SlotGrid as simulated_annealing does: grid is a
+    # grid the gates already occupy, by default they are first legalized onto a new one with whitespace.
+    # by default T_max is the mean uphill delta of random moves and T_min is T_max / 1000.
+    # after every round of moves_per_round moves (default 2 per gate), neighbouring temperatures exchange their
+    # slot assignments with probability min(1, exp((1/T_i - 1/T_j)(L_i - L_j))), alternating even and odd pairs;
+    # every temperature keeps its own move window. the best placement seen at the end of a round is written back
+    # to gate_list and grid, so the result is legal.
+    # the worker processes map the netlist from store_path (a netlist_store of the same netlist), by default from
+    # a temporary store written here, so the index arrays are shared between them instead of copied into each
+    netlist = netlist_of(gate_list)
+    profiler = instrumentation.get_profiler()
+    if moves_per_round is None:
+        moves_per_round = 2 * len(gate_list)
+    rng = random.Random(seed)
+    if grid is None:
+        grid, displacement = legalize(gate_list, whitespace=whitespace)
+    moves = WindowedMoveGenerator(gate_list, grid=grid, rng=rng)
+    if T_max is None:
+        uphill = [delta for delta in sample_move_deltas(IncrementalHPWL(net_list, gate_list, pad_list), moves)
+                  if delta > 0]
+        T_max = sum(uphill) / len(uphill) if uphill else 1.0
+    if T_min is None:
+        T_min = T_max / 1000
+    if replicas > 1:
+        temperatures = [T_max * (T_min / T_max) ** (r / (replicas - 1)) for r in range(replicas)]
+    else:
+        temperatures = [T_min]
+
+    placements = [grid.occupant.copy() for r in range(replicas)]
+    windows = [moves.window] * replicas
+    HPWL_values = [float(summation_of_HPWL(net_list, gate_list, pad_list))] * replicas
+    best_HPWL = HPWL_values[0]
+    best_placement = grid.occupant.copy()
+    stats = [{"temperature": T, "moves": 0, "accepted": 0, "exchanges_tried": 0, "exchanges_accepted": 0,
+              "best_HPWL": best_HPWL} for T in temperatures]
+
+    if processes is None:
+        processes = min(replicas, os.cpu_count() or 1)
+    grid_args = (grid.columns, grid.rows, grid.lower, grid.upper)
+    temporary_store = None
+    pool = None
+    try:
+        if processes > 1:
+            if store_path is None:
+                temporary_store = tempfile.mkdtemp(prefix="netlist_store_")
+                store_path = temporary_store
+                write_store(netlist, store_path)
+            pool = multiprocessing.Pool(processes, initializer=_init_replica_worker,
+                                        initargs=(store_path, netlist.gate_xy) + grid_args)
+            run = pool.map
+        else:
+            _set_replica(netlist, *grid_args)
+            run = lambda function, tasks: list(map(function, tasks))
+
+        for round_number in range(rounds):
+            tasks = [(placements[r], windows[r], temperatures[r], moves_per_round, rng.getrandbits(64))
+                     for r in range(replicas)]
+            with profiler.timer("PT.round"):
+                results = run(_run_replica, tasks)
+            for r, (placement, window, L, accepted) in enumerate(results):
+                placements[r] = placement
+                windows[r] = window
+                HPWL_values[r] = L
+                stats[r]["moves"] += moves_per_round
+                stats[r]["accepted"] += accepted
+                stats[r]["best_HPWL"] = min(stats[r]["best_HPWL"], L)
+                if L < best_HPWL:
+                    best_HPWL = L
+                    best_placement = placement.copy()
+            profiler.count("PT.moves", replicas * moves_per_round)
+            profiler.count("PT.accepted", sum(accepted for placement, window, L, accepted in results))
+
+            # replica exchange between neighbouring temperatures
+            for r in range(round_number % 2, replicas - 1, 2):
+                stats[r]["exchanges_tried"] += 1
+                stats[r + 1]["exchanges_tried"] += 1
+                profiler.count("PT.exchanges_tried")
+                exponent = (1 / temperatures[r] - 1 / temperatures[r + 1]) * (HPWL_values[r] - HPWL_values[r + 1])
+                if exponent >= 0 or rng.random() < math.exp(exponent):
+                    placements[r], placements[r + 1] = placements[r + 1], placements[r]
+                    HPWL_values[r], HPWL_values[r + 1] = HPWL_values[r + 1], HPWL_values[r]
+                    stats[r]["exchanges_accepted"] += 1
+                    stats[r + 1]["exchanges_accepted"] += 1
+                    profiler.count("PT.exchanges_accepted")
+            profiler.record("PT", round=round_number, HPWL=list(HPWL_values), best_HPWL=best_HPWL)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if temporary_store is not None:
+            shutil.rmtree(temporary_store, ignore_errors=True)
+
+    for r in range(replicas):
+        stats[r]["final_HPWL"] = HPWL_values[r]
+        stats[r]["acceptance_rate"] = stats[r]["accepted"] / max(stats[r]["moves"], 1)
+    grid.occupant[:] = best_placement
+    occupied = np.nonzero(grid.occupant >= 0)[0]
+    netlist.gate_xy[grid.occupant[occupied]] = grid.slot_xy[occupied]
+    return best_HPWL, stats
+
+
+def main(headless=False, tempering=False, cooling="geometric", time_budget=None, checkpoint_path=None):
     net_list, gate_list, pad_list = parser.parser("benchmarks/struct")
-    simulated_annealing(net_list, gate_list, pad_list)
+    if tempering:
+        best_HPWL, stats = parallel_tempering(net_list, gate_list, pad_list)
+        print("best HPWL:", best_HPWL)
+        for replica_stats in stats:
+            print(replica_stats)
+        return
+    observer = None
+    if not headless:
+        import visualization
+        from frame_pipeline import FrameWriter
+        frames = FrameWriter("Images_SA/Animation.gif", fps=100, scale=0.5)
+        observer = visualization.renderer(ver="SA", frames=frames)
+    schedule = AnnealingSchedule(cooling=cooling, time_budget=time_budget)
+    simulated_annealing(net_list, gate_list, pad_list, observer=observer, schedule=schedule,
+                        checkpoint_path=checkpoint_path)
+    if not headless:
+        visualization.pygame_quit(frames=frames)
+
+
+def option_value(name, default=None):
+    # value of a --name=value command line option
+    for argument in sys.argv[1:]:
+        if argument.startswith("--" + name + "="):
+            return argument.split("=", 1)[1]
+    return default
 
 
 if __name__ == "__main__":
-    main()
+    # python SA.py [--headless] [--tempering] [--cooling=lam] [--time-budget=seconds] [--checkpoint=path.npz]
+    time_budget = option_value("time-budget")
+    main(headless="--headless" in sys.argv, tempering="--tempering" in sys.argv,
+         cooling=option_value("cooling", "geometric"),
+         time_budget=None if time_budget is None else float(time_budget),
+         checkpoint_path=option_value("checkpoint"))
     print("end.")
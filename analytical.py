@@ -0,0 +1,236 @@
+import math
+import random
+import sys
+import time
+
+import numpy as np
+from scipy.fft import dctn, idctn
+
+from data_structures import netlist_of
+from evaluations import vectorized_HPWL
+import instrumentation
+
+# nonlinear analytical placement in the style of ePlace: minimizes the weighted-average (WA) wirelength plus
+# lambda times an electrostatic density penalty. every gate is a charge of the area of one legal slot, the density
+# of the bins is the potential's source (Poisson equation solved by DCT), and its field pushes gates out of dense
+# bins. the objective is minimized by Nesterov's method with the step length estimated from the local Lipschitz
+# constant, until the density overflow drops below target_overflow.
+
+
+def wa_wirelength(netlist, xy, gamma):
+    # WA wirelength of all nets and its gradient for every gate. per net and dimension
+    #   WA = sum x exp(x / gamma) / sum exp(x / gamma) - sum x exp(-x / gamma) / sum exp(-x / gamma)
+    # with the exponents shifted by the net's max (min) coordinate, so that nothing overflows
+    nonempty = np.diff(netlist.net_pin_ptr) > 0
+    starts = netlist.net_pin_ptr[:-1][nonempty]
+    pin_count = np.diff(netlist.net_pin_ptr)[nonempty]
+    pins = netlist.net_pin_idx
+    pin_xy = xy[pins]
+
+    upper = np.repeat(np.maximum.reduceat(pin_xy, starts, axis=0), pin_count, axis=0)
+    lower = np.repeat(np.minimum.reduceat(pin_xy, starts, axis=0), pin_count, axis=0)
+    a = np.exp((pin_xy - upper) / gamma)
+    b = np.exp((lower - pin_xy) / gamma)
+    a_sum = np.repeat(np.add.reduceat(a, starts, axis=0), pin_count, axis=0)
+    b_sum = np.repeat(np.add.reduceat(b, starts, axis=0), pin_count, axis=0)
+    wa_upper = np.repeat(np.add.reduceat(pin_xy * a, starts, axis=0), pin_count, axis=0) / a_sum
+    wa_lower = np.repeat(np.add.reduceat(pin_xy * b, starts, axis=0), pin_count, axis=0) / b_sum
+
+    first = np.zeros(len(pins), dtype=bool)
+    first[starts] = True
+    wirelength = ((wa_upper - wa_lower)[first]).sum()
+    pin_gradient = a / a_sum * (1 + (pin_xy - wa_upper) / gamma) - b / b_sum * (1 - (pin_xy - wa_lower) / gamma)
+
+    # the pad pins are fixed, only the gate pins move
+    is_gate = pins < netlist.num_gates
+    gradient = np.column_stack([np.bincount(pins[is_gate], weights=pin_gradient[is_gate, d],
+                                            minlength=netlist.num_gates) for d in range(2)])
+    return wirelength, gradient
+
+
+class DensityGrid:
+    # bins x bins bins over the region [lower, upper]. the charge of a gate is spread bilinearly over the four bins
+    # around its position, the potential psi solves the discrete Poisson equation laplace(psi) = -(density - mean)
+    # with Neumann boundaries through a DCT, and the density gradient of a gate is its charge times the slope of
+    # psi under its bilinear weights
+    def __init__(self, bins, gate_area, lower=(0, 0), upper=(100, 100)):
+        self.bins = int(bins)
+        self.lower = np.asarray(lower, dtype=np.float64)
+        self.upper = np.asarray(upper, dtype=np.float64)
+        self.bin_size = (self.upper - self.lower) / self.bins
+        self.bin_area = self.bin_size[0] * self.bin_size[1]
+        self.gate_area = gate_area
+        frequencies = 2 * np.cos(np.pi * np.arange(self.bins) / self.bins) - 2
+        eigenvalues = frequencies[:, None] + frequencies[None, :]
+        eigenvalues[0, 0] = 1
+        self.inverse_eigenvalues = -1 / eigenvalues
+        self.inverse_eigenvalues[0, 0] = 0
+
+    def _bilinear(self, gate_xy):
+        # lower left bin and weights of the four bins around every gate, on the grid of bin centers
+        position = (gate_xy - self.lower) / self.bin_size - 0.5
+        position = np.clip(position, 0, self.bins - 1 - 1e-9)
+        cell = position.astype(np.int64)
+        cell = np.minimum(cell, self.bins - 2)
+        return cell, position - cell
+
+    def density(self, gate_xy):
+        # occupied fraction of every bin
+        cell, fraction = self._bilinear(gate_xy)
+        density = np.zeros((self.bins, self.bins), dtype=np.float64)
+        for dx, dy in ((0, 0), (1, 0), (0, 1), (1, 1)):
+            weight = np.where(dx, fraction[:, 0], 1 - fraction[:, 0]) * np.where(dy, fraction[:, 1], 1 - fraction[:, 1])
+            np.add.at(density, (cell[:, 0] + dx, cell[:, 1] + dy), weight * self.gate_area / self.bin_area)
+        return density
+
+    def overflow(self, density, target_density=1.0):
+        # area above the target density over the total gate area
+        total = density.sum() * self.bin_area
+        return np.maximum(density - target_density, 0).sum() * self.bin_area / total if total > 0 else 0.0
+
+    def penalty(self, gate_xy):
+        # electrostatic energy and its gradient for every gate, and the density map
+        density = self.density(gate_xy)
+        psi = idctn(dctn(density - density.mean(), type=2, norm="ortho") * self.inverse_eigenvalues, type=2,
+                    norm="ortho")
+        # the exact gradient of the energy: the charge times the derivative of the bilinear weights times psi
+        cell, fraction = self._bilinear(gate_xy)
+        c_x = cell[:, 0]
+        c_y = cell[:, 1]
+        f_x = fraction[:, 0]
+        f_y = fraction[:, 1]
+        gradient = np.column_stack(((1 - f_y) * (psi[c_x + 1, c_y] - psi[c_x, c_y]) +
+                                    f_y * (psi[c_x + 1, c_y + 1] - psi[c_x, c_y + 1]),
+                                    (1 - f_x) * (psi[c_x, c_y + 1] - psi[c_x, c_y]) +
+                                    f_x * (psi[c_x + 1, c_y + 1] - psi[c_x + 1, c_y])))
+        gradient *= self.gate_area / self.bin_area / self.bin_size
+        energy = 0.5 * (density * psi).sum()
+        return energy, gradient, density
+
+
+def analytical_placement(net_list, gate_list, pad_list, initial="quadratic", whitespace=0.2, bins=None,
+                         target_overflow=0.1, max_iterations=1000, lambda_growth=1.05, noise=0.5, rng=random,
+                         observer=None, observe_every=10, trace=None):
+    # global placement starting from the wirelength optimum of Quadratic.solve (initial="quadratic", where the
+    # overflow is high and the density penalty spreads the gates) or from the current coordinates ("current").
+    # every gate has the area of one slot of the legal grid with (1 + whitespace) slots per gate, and by default
+    # the density grid has one bin per slot: the bilinear spreading of a gate is then exactly its overlap with the
+    # bins, so the density map is the true area density of the gates. the start is jittered by up to noise bin
+    # widths: gates lumped within one bin all see the same field and would never separate.
+    # lambda starts at the ratio of the wirelength and density gradient norms and grows by lambda_growth every
+    # iteration, gamma (the WA smoothing) shrinks with the overflow from 80 to 0.8 bin widths as in ePlace.
+    # observer(net_list, gate_list, pad_list, remark=N) is called every observe_every iterations.
+    # trace, a TraceRecorder with the columns HPWL and overflow, records every iteration.
+    # returns {"iterations", "overflow", "HPWL"}
+    netlist = netlist_of(gate_list)
+    profiler = instrumentation.get_profiler()
+    if initial == "quadratic":
+        from Quadratic import solve
+        # the start only has to be close, a loose CG solve is much cheaper than the direct one on large netlists
+        solve(net_list, gate_list, pad_list, solver="cg", tol=1e-3)
+    elif initial != "current":
+        raise ValueError("unknown initial placement: " + str(initial))
+    lower = np.zeros(2)
+    upper = np.full(2, 100.0)
+    slots_per_side = math.ceil(math.sqrt(netlist.num_gates * (1 + whitespace)))
+    if bins is None:
+        bins = max(slots_per_side, 2)
+    grid = DensityGrid(bins, (100 / slots_per_side) ** 2, lower, upper)
+    xy = netlist.xy.copy()
+    degree = np.diff(netlist.gate_net_ptr).astype(np.float64)
+    charge = grid.gate_area / grid.bin_area
+
+    def gradient_at(gate_xy, gamma):
+        xy[:netlist.num_gates] = gate_xy
+        with profiler.timer("analytical.wirelength"):
+            wirelength, wirelength_gradient = wa_wirelength(netlist, xy, gamma)
+        with profiler.timer("analytical.density"):
+            energy, density_gradient, density = grid.penalty(gate_xy)
+        return wirelength_gradient, density_gradient, density
+
+    def gamma_of(overflow):
+        return 8.0 * grid.bin_size[0] * 10 ** (20 / 9 * overflow - 11 / 9)
+
+    jitter = np.array([[rng.uniform(-noise, noise), rng.uniform(-noise, noise)] for i in range(netlist.num_gates)])
+    u = np.clip(netlist.gate_xy + jitter * grid.bin_size, lower, upper)
+    overflow = grid.overflow(grid.density(u))
+    gamma = gamma_of(overflow)
+    wirelength_gradient, density_gradient, density = gradient_at(u, gamma)
+    density_weight = np.abs(wirelength_gradient).sum() / max(np.abs(density_gradient).sum(), 1e-12)
+
+    def preconditioned(wirelength_gradient, density_gradient, density_weight):
+        # the Hessian diagonal of ePlace: pins of the gate plus lambda times its charge
+        gradient = wirelength_gradient + density_weight * density_gradient
+        return gradient / np.maximum(degree + density_weight * charge, 1.0)[:, None]
+
+    v = u.copy()
+    gradient = preconditioned(wirelength_gradient, density_gradient, density_weight)
+    # first step a tenth of a bin for the largest move, to start the Lipschitz estimate
+    previous_v = v + 0.1 * grid.bin_size[0] * gradient / max(np.abs(gradient).max(), 1e-12)
+    previous_gradient = preconditioned(*gradient_at(previous_v, gamma)[:2], density_weight)
+    a = 1.0
+    iteration = 0
+    HPWL = vectorized_HPWL(netlist)[0]
+    for iteration in range(1, max_iterations + 1):
+        iteration_start = time.perf_counter()
+        # step length 1 / L with the Lipschitz constant L estimated from the last two reference points
+        gradient_change = np.linalg.norm(gradient - previous_gradient)
+        step = np.linalg.norm(v - previous_v) / gradient_change if gradient_change > 0 else grid.bin_size[0]
+        u_next = np.clip(v - step * gradient, lower, upper)
+        a_next = (1 + math.sqrt(4 * a * a + 1)) / 2
+        previous_v = v
+        previous_gradient = gradient
+        v = np.clip(u_next + (a - 1) / a_next * (u_next - u), lower, upper)
+        u = u_next
+        a = a_next
+
+        density_weight *= lambda_growth
+        wirelength_gradient, density_gradient, density = gradient_at(v, gamma)
+        gradient = preconditioned(wirelength_gradient, density_gradient, density_weight)
+        overflow = grid.overflow(density)
+        gamma = gamma_of(overflow)
+
+        netlist.gate_xy[:] = u
+        HPWL = vectorized_HPWL(netlist)[0]
+        if trace is not None:
+            trace.record(HPWL, overflow)
+        profiler.count("analytical.iterations")
+        profiler.record("analytical", HPWL=HPWL, overflow=overflow, step=step, gamma=gamma,
+                        density_weight=density_weight, iteration_time=time.perf_counter() - iteration_start)
+        if observer is not None and iteration % observe_every == 0:
+            observer(net_list, gate_list, pad_list, remark=iteration)
+        if overflow < target_overflow:
+            break
+
+    if trace is not None:
+        trace.flush()
+    return {"iterations": iteration, "overflow": overflow, "HPWL": HPWL}
+
+
+def main(headless=False):
+    import parser
+    from evaluations import summation_of_HPWL
+    from legalization import legalize_and_refine
+    from trace_recorder import TraceRecorder
+
+    net_list, gate_list, pad_list = parser.parser("benchmarks/struct")
+    print("initial HPWL:", summation_of_HPWL(net_list, gate_list, pad_list))
+    observer = None
+    if not headless:
+        import visualization
+        from frame_pipeline import FrameWriter
+        frames = FrameWriter("analytical_images/Animation.gif", fps=20, scale=0.5)
+        observer = visualization.renderer(path="analytical_images", frames=frames)
+    trace = TraceRecorder(columns=("HPWL", "overflow"), path="HPWL_list_analytical.csv")
+    result = analytical_placement(net_list, gate_list, pad_list, observer=observer, trace=trace)
+    trace.close()
+    print("analytical placement stopped after", result["iterations"], "iterations, overflow", result["overflow"])
+    print("analytical HPWL:", summation_of_HPWL(net_list, gate_list, pad_list))
+    result = legalize_and_refine(net_list, gate_list, pad_list)
+    print("legalized HPWL:", result["legal_HPWL"], "detailed placement HPWL:", result["detailed_HPWL"])
+    if not headless:
+        visualization.pygame_quit(frames=frames)
+
+
+if __name__ == "__main__":
+    main(headless="--headless" in sys.argv)
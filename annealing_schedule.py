@@ -0,0 +1,153 @@
+import math
+import os
+import random
+import time
+
+import numpy as np
+
+
+class AnnealingSchedule:
+    # temperature control of simulated_annealing.
+    #   cooling "geometric": T *= alpha after every temperature
+    #   cooling "lam": T follows the modified Lam acceptance target (about 1.0 falling to 0.44 over the first 15%
+    #                  of the run, 0.44 until 65%, then falling to about 0), T *= exp(gain * (target - rate))
+    # the run progress is the larger of elapsed / time_budget and temperatures / max_temperatures, a lam run
+    # freezes when it reaches 1, a geometric one also after patience temperatures without improvement.
+    # the initial temperature, unless given, is calibrated so that the average sampled uphill move is accepted
+    # with probability initial_acceptance.
+    def __init__(self, cooling="geometric", initial_temperature=None, initial_acceptance=0.8, alpha=0.9,
+                 moves_per_gate=5, gain=2.0, max_temperatures=None, time_budget=None, patience=10,
+                 tolerance=1e-4, checkpoint_interval=600.0):
+        if cooling not in ("geometric", "lam"):
+            raise ValueError("unknown cooling: " + str(cooling))
+        if cooling == "lam" and max_temperatures is None and time_budget is None:
+            # the acceptance target needs to know how far the run is
+            max_temperatures = 200
+        self.cooling = cooling
+        self.initial_temperature = initial_temperature
+        self.initial_acceptance = initial_acceptance
+        self.alpha = alpha
+        self.moves_per_gate = moves_per_gate
+        self.gain = gain
+        self.max_temperatures = max_temperatures
+        self.time_budget = time_budget
+        self.patience = patience
+        self.tolerance = tolerance
+        self.checkpoint_interval = checkpoint_interval
+        self.temperatures = 0
+        self._elapsed_before = 0.0
+        self._start = None
+        self._last_checkpoint = None
+
+    def start(self, elapsed=0.0, temperatures=0):
+        # elapsed seconds and temperatures of an earlier, checkpointed part of the same anneal
+        self._elapsed_before = elapsed
+        self.temperatures = temperatures
+        self._start = time.monotonic()
+        self._last_checkpoint = self._start
+
+    def elapsed(self):
+        return self._elapsed_before + time.monotonic() - self._start
+
+    def calibrate(self, hpwl, moves, samples=200):
+        # -mean uphill delta / ln(initial_acceptance), from moves proposed and rolled back
+        if self.initial_temperature is not None:
+            return self.initial_temperature
+        uphill = []
+        for n in range(samples):
+            delta = moves.propose(hpwl)
+            moves.reject(hpwl)
+            if delta > 0:
+                uphill.append(delta)
+        moves.proposed = 0
+        if not uphill:
+            return 1.0
+        return -(sum(uphill) / len(uphill)) / math.log(self.initial_acceptance)
+
+    def moves_per_temperature(self, num_gates):
+        return max(1, int(self.moves_per_gate * num_gates))
+
+    def progress(self):
+        progress = 0.0
+        if self.time_budget:
+            progress = self.elapsed() / self.time_budget
+        if self.max_temperatures:
+            progress = max(progress, self.temperatures / self.max_temperatures)
+        return min(progress, 1.0)
+
+    def target_acceptance(self):
+        # modified Lam target acceptance rate at the current progress
+        s = self.progress()
+        if s < 0.15:
+            return 0.44 + 0.56 * 560 ** (-s / 0.15)
+        if s < 0.65:
+            return 0.44
+        return 0.44 * 440 ** (-(s - 0.65) / 0.35)
+
+    def next_temperature(self, T, acceptance_rate):
+        self.temperatures += 1
+        if self.cooling == "geometric":
+            return self.alpha * T
+        factor = math.exp(self.gain * (self.target_acceptance() - acceptance_rate))
+        return T * min(max(factor, 0.5), 1.5)
+
+    def out_of_time(self):
+        return self.time_budget is not None and self.elapsed() >= self.time_budget
+
+    def frozen(self, HPWL_list):
+        # out of time or temperatures. geometric cooling also freezes when the HPWL has not improved by tolerance
+        # over the last patience temperatures; lam cooling holds the acceptance rate at 0.44 until 65% of the run,
+        # a plateau without improvement by design, so it only stops at the end of its schedule
+        if self.out_of_time():
+            return True
+        if self.max_temperatures is not None and self.temperatures >= self.max_temperatures:
+            return True
+        if self.cooling == "lam":
+            return self.progress() >= 1.0
+        if len(HPWL_list) > self.patience:
+            return min(HPWL_list[-self.patience:]) >= HPWL_list[-self.patience - 1] * (1 - self.tolerance)
+        return False
+
+    def checkpoint_due(self):
+        if time.monotonic() - self._last_checkpoint < self.checkpoint_interval:
+            return False
+        self._last_checkpoint = time.monotonic()
+        return True
+
+
+def _random_state_arrays(state):
+    version, internal, gauss_next = state
+    return np.array(internal, dtype=np.int64), np.array([version, np.nan if gauss_next is None else gauss_next])
+
+
+def _random_state(internal, header):
+    gauss_next = None if np.isnan(header[1]) else float(header[1])
+    return int(header[0]), tuple(int(value) for value in internal), gauss_next
+
+
+def save_checkpoint(path, gate_xy, T, HPWL_list, schedule, moves):
+    # coordinates, temperature, HPWL history, schedule position, move generator and both RNG states,
+    # written to a temporary file and renamed so that an interruption never leaves a broken checkpoint
+    random_internal, random_header = _random_state_arrays(random.getstate())
+    moves_internal, moves_header = _random_state_arrays(moves.rng.getstate())
+    moves_state = {"moves_" + key: value for key, value in moves.get_state().items()}
+    temp_path = path + ".%d.tmp" % os.getpid()
+    with open(temp_path, "wb") as file:
+        np.savez(file, gate_xy=gate_xy, T=T, HPWL_list=np.array(HPWL_list, dtype=np.float64),
+                 elapsed=schedule.elapsed(), temperatures=schedule.temperatures,
+                 random_internal=random_internal, random_header=random_header,
+                 moves_random_internal=moves_internal, moves_random_header=moves_header, **moves_state)
+    os.replace(temp_path, path)
+
+
+def load_checkpoint(path, gate_xy, schedule, moves):
+    # restores the coordinates, RNG states and move generator in place and restarts the schedule where it stopped,
+    # returns T and the HPWL history
+    with np.load(path) as arrays:
+        gate_xy[:] = arrays["gate_xy"]
+        random.setstate(_random_state(arrays["random_internal"], arrays["random_header"]))
+        moves.rng.setstate(_random_state(arrays["moves_random_internal"], arrays["moves_random_header"]))
+        moves.set_state({key[len("moves_"):]: arrays[key] for key in arrays.files
+                         if key.startswith("moves_") and not key.startswith("moves_random_")})
+        schedule.start(float(arrays["elapsed"]), int(arrays["temperatures"]))
+        return float(arrays["T"]), arrays["HPWL_list"].tolist()
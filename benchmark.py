@@ -0,0 +1,222 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import time
+
+import numpy as np
+
+BENCHMARKS = ["toy1", "toy2", "primary1", "fract", "struct", "biomed"]
+PLACERS = ["SA", "quadratic", "FD", "ZFT", "mincut", "multilevel_SA", "multilevel_FD", "analytical"]
+
+# every (placer, benchmark) pair runs in a child process of its own, so that its peak RSS (getrusage of the child)
+# and its wall time are not mixed up with the other runs. a result is
+#   {"placer", "benchmark", "seed", "status": "ok" | "timeout" | "error", "wall_time", "phases": {name: seconds},
+#    "peak_rss_kb", "iterations", "HPWL", "global_HPWL", "profile"}
+# where HPWL is the final (legal) HPWL, global_HPWL the HPWL before legalization and profile the summary of the
+# instrumentation timers and counters of the run.
+
+
+def run_placer(placer, net_list, gate_list, pad_list, phases, SA_time_budget=60.0):
+    # runs one placer including its legalization, fills phases and returns (iterations, global HPWL)
+    from legalization import legalize_and_refine
+
+    start = time.perf_counter()
+    if placer == "SA":
+        from SA import simulated_annealing
+        from annealing_schedule import AnnealingSchedule
+        from trace_recorder import TraceRecorder
+        schedule = AnnealingSchedule(cooling="lam", time_budget=SA_time_budget)
+        simulated_annealing(net_list, gate_list, pad_list, schedule=schedule,
+                            trace=TraceRecorder(capacity=1024, ring=True))
+        iterations = schedule.temperatures
+        spread = False
+    elif placer == "quadratic":
+        from Quadratic import solve
+        solve(net_list, gate_list, pad_list)
+        iterations = 1
+        spread = True
+    elif placer == "FD":
+        from forced_direct import forced_directed_placement_with_repulsive_force
+        iterations = forced_directed_placement_with_repulsive_force(net_list, gate_list, pad_list)["iterations"]
+        spread = False
+    elif placer == "ZFT":
+        from forced_direct import forced_directed_placement
+        forced_directed_placement(net_list, gate_list, pad_list)
+        iterations = len(gate_list)
+        spread = False
+    elif placer == "mincut":
+        from mincut import mincut_placement
+        iterations = mincut_placement(net_list, gate_list, pad_list)["regions"]
+        spread = False
+    elif placer == "analytical":
+        from analytical import analytical_placement
+        iterations = analytical_placement(net_list, gate_list, pad_list)["iterations"]
+        spread = False
+    elif placer.startswith("multilevel_"):
+        from multilevel import multilevel_placement
+        place = placer[len("multilevel_"):]
+        result = multilevel_placement(net_list, gate_list, pad_list, place=place,
+                                      time_budget=SA_time_budget if place == "SA" else None)
+        iterations = len(result["gates"])
+        spread = False
+    else:
+        raise ValueError("unknown placer: " + str(placer))
+    phases["place"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = legalize_and_refine(net_list, gate_list, pad_list, spread=spread)
+    phases["legalize"] = time.perf_counter() - start
+    return iterations, result["global_HPWL"]
+
+
+def _run_in_child(connection, placer, benchmark_path, seed, SA_time_budget, profile_path=None):
+    import parser
+    import instrumentation
+    from evaluations import summation_of_HPWL
+
+    result = {}
+    profiler = instrumentation.enable()
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            random.seed(seed)
+            np.random.seed(seed)
+            phases = {}
+            wall_start = time.perf_counter()
+            start = time.perf_counter()
+            net_list, gate_list, pad_list = parser.parser(benchmark_path)
+            phases["parse"] = time.perf_counter() - start
+            iterations, global_HPWL = run_placer(placer, net_list, gate_list, pad_list, phases, SA_time_budget)
+            start = time.perf_counter()
+            HPWL = summation_of_HPWL(net_list, gate_list, pad_list)
+            phases["evaluate"] = time.perf_counter() - start
+            result.update(status="ok", wall_time=time.perf_counter() - wall_start, phases=phases,
+                          iterations=int(iterations), HPWL=float(HPWL), global_HPWL=float(global_HPWL))
+    except Exception as error:
+        result.update(status="error", error="%s: %s" % (type(error).__name__, error))
+    result["peak_rss_kb"] = peak_rss_kb()
+    result["profile"] = profiler.summary()
+    if profile_path is not None:
+        profiler.export(profile_path)
+    connection.send(result)
+    connection.close()
+
+
+def peak_rss_kb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def run_one(placer, benchmark, benchmark_dir="benchmarks", seed=0, timeout=None, SA_time_budget=60.0,
+            profile_dir=None):
+    # with profile_dir the instrumentation of the run, including its per-iteration series, is exported to
+    # profile_dir/<benchmark>.<placer>.json
+    profile_path = None
+    if profile_dir is not None:
+        os.makedirs(profile_dir, exist_ok=True)
+        profile_path = os.path.join(profile_dir, "%s.%s.json" % (benchmark, placer))
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_run_in_child,
+                                      args=(sender, placer, os.path.join(benchmark_dir, benchmark), seed,
+                                            SA_time_budget, profile_path))
+    process.start()
+    sender.close()
+    result = {"placer": placer, "benchmark": benchmark, "seed": seed}
+    if receiver.poll(timeout):
+        try:
+            result.update(receiver.recv())
+        except EOFError:
+            result.update(status="error", error="the child process exited with code %s" % process.exitcode)
+    else:
+        process.terminate()
+        result.update(status="timeout", wall_time=timeout)
+    process.join()
+    return result
+
+
+def run_suite(placers=PLACERS, benchmarks=BENCHMARKS, benchmark_dir="benchmarks", seed=0, timeout=None,
+              SA_time_budget=60.0, profile_dir=None):
+    results = []
+    for benchmark in benchmarks:
+        for placer in placers:
+            result = run_one(placer, benchmark, benchmark_dir, seed, timeout, SA_time_budget, profile_dir)
+            results.append(result)
+            if result["status"] == "ok":
+                print("%-10s %-9s %8.2fs  HPWL %12.1f  peak RSS %8d kB  iterations %d"
+                      % (benchmark, placer, result["wall_time"], result["HPWL"], result["peak_rss_kb"] or 0,
+                         result["iterations"]))
+            else:
+                print("%-10s %-9s %s %s" % (benchmark, placer, result["status"], result.get("error", "")))
+    return {"meta": {"seed": seed, "SA_time_budget": SA_time_budget, "python": platform.python_version(),
+                     "machine": platform.machine(), "cpu_count": os.cpu_count(),
+                     "date": time.strftime("%Y-%m-%d %H:%M:%S")},
+            "results": results}
+
+
+def compare(results, baseline, time_tolerance=0.2, HPWL_tolerance=0.02, min_time=0.5):
+    # regressions of results against the baseline: a run slower than (1 + time_tolerance) times the baseline (and
+    # by more than min_time seconds), a final HPWL worse than (1 + HPWL_tolerance) times the baseline, or a run
+    # that no longer finishes. returns a list of messages
+    baseline_runs = {(run["placer"], run["benchmark"]): run for run in baseline["results"]}
+    regressions = []
+    for run in results["results"]:
+        base = baseline_runs.get((run["placer"], run["benchmark"]))
+        if base is None or base["status"] != "ok":
+            continue
+        name = "%s on %s" % (run["placer"], run["benchmark"])
+        if run["status"] != "ok":
+            regressions.append("%s: %s (baseline ok)" % (name, run["status"]))
+            continue
+        if run["wall_time"] > base["wall_time"] * (1 + time_tolerance) and \
+                run["wall_time"] - base["wall_time"] > min_time:
+            regressions.append("%s: wall time %.2fs, baseline %.2fs" % (name, run["wall_time"], base["wall_time"]))
+        if run["HPWL"] > base["HPWL"] * (1 + HPWL_tolerance):
+            regressions.append("%s: HPWL %.1f, baseline %.1f" % (name, run["HPWL"], base["HPWL"]))
+    return regressions
+
+
+def main():
+    # python benchmark.py --placers SA FD --benchmarks toy1 toy2 --baseline benchmark_baseline.json
+    argument_parser = argparse.ArgumentParser(description="run the placers on the benchmarks")
+    argument_parser.add_argument("--placers", nargs="+", default=PLACERS, choices=PLACERS)
+    argument_parser.add_argument("--benchmarks", nargs="+", default=BENCHMARKS)
+    argument_parser.add_argument("--benchmark-dir", default="benchmarks")
+    argument_parser.add_argument("--seed", type=int, default=0)
+    argument_parser.add_argument("--timeout", type=float, default=None, help="seconds per run")
+    argument_parser.add_argument("--SA-time-budget", type=float, default=60.0)
+    argument_parser.add_argument("--output", default="benchmark_results.json")
+    argument_parser.add_argument("--baseline", default=None, help="results file to compare against")
+    argument_parser.add_argument("--time-tolerance", type=float, default=0.2)
+    argument_parser.add_argument("--HPWL-tolerance", type=float, default=0.02)
+    argument_parser.add_argument("--profile-dir", default=None,
+                                 help="directory for the instrumentation (with time series) of every run")
+    arguments = argument_parser.parse_args()
+
+    results = run_suite(arguments.placers, arguments.benchmarks, arguments.benchmark_dir, arguments.seed,
+                        arguments.timeout, arguments.SA_time_budget, arguments.profile_dir)
+    with open(arguments.output, "w") as file:
+        json.dump(results, file, indent=1)
+    print("results written to", arguments.output)
+
+    if arguments.baseline is not None:
+        with open(arguments.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, arguments.time_tolerance, arguments.HPWL_tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if regressions:
+            sys.exit(1)
+        print("no regressions against", arguments.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,170 @@
 import random
 import numpy as np
+from scipy.sparse import csr_matrix
 
 
-class Gate:
-    def __init__(self, gate_id, connectivity):
-        self.id = gate_id
-        self.connectivity = connectivity
-        self.connected_nets = []
-        self.coordinate = np.array([random.randint(0, 1000) / 10, random.randint(0, 1000) / 10])
+class Netlist:
+    # array backed netlist. every index is 0-based, while the IDs of the Gate/Net/Pad views stay 1-based.
+    # gate and pad coordinates share one contiguous (num_gates + num_pads, 2) buffer, so a pin index
+    # below num_gates is a gate and the others are pads (pin - num_gates is the pad index).
+    def __init__(self, num_nets, gate_net_ptr, gate_net_idx, pad_net, pad_xy, gate_xy=None, derived=None):
+        # derived optionally holds the already computed net_pin_ptr, net_pin_idx, net_gate_count and
+        # connected_cell_number (e.g. read-only memory maps of a netlist store), which are then used as they are
+        self.num_gates = len(gate_net_ptr) - 1
+        self.num_nets = int(num_nets)
+        self.num_pads = len(pad_net)
+
+        # gate -> net incidence as CSR
+        self.gate_net_ptr = np.asarray(gate_net_ptr, dtype=np.int64)
+        self.gate_net_idx = np.asarray(gate_net_idx, dtype=np.int64)
+        self.pad_net = np.asarray(pad_net, dtype=np.int64)
+
+        # coordinates, always private to this netlist
+        self.xy = np.empty((self.num_gates + self.num_pads, 2), dtype=np.float64)
+        self.gate_xy = self.xy[:self.num_gates]
+        self.pad_xy = self.xy[self.num_gates:]
+        self.pad_xy[:] = np.reshape(pad_xy, (self.num_pads, 2))
+        if gate_xy is None:
+            self.random_placement()
+        else:
+            self.gate_xy[:] = gate_xy
+
+        if derived is not None:
+            self.net_pin_ptr = derived["net_pin_ptr"]
+            self.net_pin_idx = derived["net_pin_idx"]
+            self.net_gate_count = derived["net_gate_count"]
+            self.connected_cell_number = derived["connected_cell_number"]
+        else:
+            # net -> pin incidence as CSR, the gates of a net come before its pads
+            gate_pins = np.repeat(np.arange(self.num_gates), np.diff(self.gate_net_ptr))
+            pad_pins = self.num_gates + np.arange(self.num_pads)
+            pins = np.concatenate((gate_pins, pad_pins))
+            pin_nets = np.concatenate((self.gate_net_idx, self.pad_net))
+            order = np.lexsort((pins, pin_nets))
+            self.net_pin_idx = pins[order]
+            self.net_pin_ptr = np.zeros(self.num_nets + 1, dtype=np.int64)
+            np.cumsum(np.bincount(pin_nets, minlength=self.num_nets), out=self.net_pin_ptr[1:])
+            self.net_gate_count = np.bincount(self.gate_net_idx, minlength=self.num_nets)
+
+            # number of cells (gates and pads) reached through the nets of each gate, as counted by the FD algorithm
+            net_size = np.diff(self.net_pin_ptr)
+            self.connected_cell_number = np.bincount(gate_pins, weights=net_size[self.gate_net_idx],
+                                                     minlength=self.num_gates).astype(np.int64)
+
         # variables for FD algorithm
+        self.gate_force = np.zeros((self.num_gates, 2), dtype=np.float64)
+        self.gate_velocity = np.zeros((self.num_gates, 2), dtype=np.float64)
+        self.gate_mass = np.full(self.num_gates, 17, dtype=np.float64)
+
+        self._incidence = None
+
+    def random_placement(self):
+        # same draws as the original per-gate initialization, so random.seed() still reproduces a run
+        for i in range(self.num_gates):
+            self.gate_xy[i, 0] = random.randint(0, 1000) / 10
+            self.gate_xy[i, 1] = random.randint(0, 1000) / 10
+
+    def gate_nets(self, gate_idx):
+        return self.gate_net_idx[self.gate_net_ptr[gate_idx]:self.gate_net_ptr[gate_idx + 1]]
+
+    def net_gates(self, net_idx):
+        start = self.net_pin_ptr[net_idx]
+        return self.net_pin_idx[start:start + self.net_gate_count[net_idx]]
+
+    def net_pads(self, net_idx):
+        start = self.net_pin_ptr[net_idx] + self.net_gate_count[net_idx]
+        return self.net_pin_idx[start:self.net_pin_ptr[net_idx + 1]] - self.num_gates
+
+    def incidence_matrices(self):
+        # (num_nets, num_gates) and (num_nets, num_pads) sparse incidence, a gate listed twice on a net counts twice
+        if self._incidence is None:
+            pin_count = np.diff(self.net_pin_ptr)
+            pin_nets = np.repeat(np.arange(self.num_nets), pin_count)
+            is_gate = self.net_pin_idx < self.num_gates
+            ones = np.ones(len(pin_nets), dtype=np.float64)
+            gate_incidence = csr_matrix((ones[is_gate], (pin_nets[is_gate], self.net_pin_idx[is_gate])),
+                                        shape=(self.num_nets, self.num_gates))
+            pad_incidence = csr_matrix((ones[~is_gate],
+                                        (pin_nets[~is_gate], self.net_pin_idx[~is_gate] - self.num_gates)),
+                                       shape=(self.num_nets, self.num_pads))
+            self._incidence = gate_incidence, pad_incidence
+        return self._incidence
+
+    def make_lists(self):
+        # object views over the arrays, for the code written against net_list, gate_list and pad_list
+        net_list = [Net(self, i) for i in range(self.num_nets)]
+        gate_list = [Gate(self, i) for i in range(self.num_gates)]
+        pad_list = [Pad(self, i) for i in range(self.num_pads)]
+        return net_list, gate_list, pad_list
+
+
+def netlist_of(gate_list):
+    return gate_list[0].netlist
+
+
+class Gate:
+    __slots__ = ("netlist", "index", "status", "benchmark_for_order")
+
+    def __init__(self, netlist, index):
+        self.netlist = netlist
+        self.index = index
+        # variables for FD algorithm, force, velocity and mass live in the netlist arrays
         self.status = 0  # 0 means unmoved
-        self.connected_cell_number = 0
-        self.force = np.array([0, 0])
-        self.velocity = np.array([0, 0])
-        self.mass = 17
 
-    def reformat_data_type(self):
-        for i in range(len(self.connected_nets)):
-            self.connected_nets[i] = int(self.connected_nets[i])
-        self.connectivity = int(self.connectivity)
-        self.id = int(self.id)
+    @property
+    def id(self):
+        return self.index + 1
+
+    @property
+    def connectivity(self):
+        return int(self.netlist.gate_net_ptr[self.index + 1] - self.netlist.gate_net_ptr[self.index])
+
+    @property
+    def connected_nets(self):
+        return (self.netlist.gate_nets(self.index) + 1).tolist()
+
+    @property
+    def connected_cell_number(self):
+        return int(self.netlist.connected_cell_number[self.index])
+
+    @connected_cell_number.setter
+    def connected_cell_number(self, value):
+        if not self.netlist.connected_cell_number.flags.writeable:
+            raise ValueError("connected_cell_number of gate %d is read-only (e.g. a netlist store)" % self.id)
+        self.netlist.connected_cell_number[self.index] = value
+
+    @property
+    def coordinate(self):
+        # a view into the netlist buffer, copy it before moving the gate if the old position is needed
+        return self.netlist.gate_xy[self.index]
+
+    @coordinate.setter
+    def coordinate(self, coordinate):
+        self.netlist.gate_xy[self.index] = coordinate
+
+    @property
+    def force(self):
+        return self.netlist.gate_force[self.index]
+
+    @force.setter
+    def force(self, force):
+        self.netlist.gate_force[self.index] = force
+
+    @property
+    def velocity(self):
+        return self.netlist.gate_velocity[self.index]
+
+    @velocity.setter
+    def velocity(self, velocity):
+        self.netlist.gate_velocity[self.index] = velocity
+
+    @property
+    def mass(self):
+        return self.netlist.gate_mass[self.index]
+
+    @mass.setter
+    def mass(self, mass):
+        self.netlist.gate_mass[self.index] = mass
 
     def set_coordinate(self, coordinate):
         self.coordinate = coordinate
@@ -27,25 +172,44 @@ class Gate:
 
 
 class Pad:
-    def __init__(self, pad_number, connected_net, x, y):
-        self.pad_number = pad_number
-        self.connected_net = connected_net
-        self.coordinate = np.array([x, y])
+    __slots__ = ("netlist", "index")
+
+    def __init__(self, netlist, index):
+        self.netlist = netlist
+        self.index = index
+
+    @property
+    def pad_number(self):
+        return self.index + 1
+
+    @property
+    def connected_net(self):
+        return int(self.netlist.pad_net[self.index]) + 1
+
+    @property
+    def coordinate(self):
+        return self.netlist.pad_xy[self.index]
 
-    def reformat_data_type(self):
-        self.pad_number = int(self.pad_number)
-        self.connected_net = int(self.connected_net)
+    @coordinate.setter
+    def coordinate(self, coordinate):
+        self.netlist.pad_xy[self.index] = coordinate
 
 
 class Net:
-    def __init__(self, net_number):
-        self.net_number = net_number
-        self.connected_gates = []
-        self.connected_pad = []
-
-    def reformat_data_type(self):
-        self.net_number = int(self.net_number)
-        for i in range(len(self.connected_gates)):
-            self.connected_gates[i] = int(self.connected_gates[i])
-        for i in range(len(self.connected_pad)):
-            self.connected_pad[i] = int(self.connected_pad[i])
+    __slots__ = ("netlist", "index")
+
+    def __init__(self, netlist, index):
+        self.netlist = netlist
+        self.index = index
+
+    @property
+    def net_number(self):
+        return self.index + 1
+
+    @property
+    def connected_gates(self):
+        return (self.netlist.net_gates(self.index) + 1).tolist()
+
+    @property
+    def connected_pad(self):
+        return (self.netlist.net_pads(self.index) + 1).tolist()
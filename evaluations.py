@@ -1,43 +1,170 @@
 from data_structures import Gate
 from data_structures import Pad
 from data_structures import Net
+from data_structures import netlist_of
 from math import inf
+import numpy as np
+import instrumentation
 
-def summation_of_HPWL(net_list, gate_list, pad_list):
-    L = 0
-    for i in range(len(net_list)):
-        net_iter: Net = net_list[i]
-        x_min = inf
-        x_max = -inf
-        y_min = inf
-        y_max = -inf
-        # consider gate coordinates
-        for j in range(len(net_iter.connected_gates)):
-            gate_number = net_iter.connected_gates[j]
-            gate_iter: Gate = gate_list[gate_number-1]
-            gate_coordinate = gate_iter.coordinate
-            if gate_coordinate[0] < x_min:
-                x_min = gate_coordinate[0]
-            if gate_coordinate[0] > x_max:
-                x_max = gate_coordinate[0]
-            if gate_coordinate[1] < y_min:
-                y_min = gate_coordinate[1]
-            if gate_coordinate[1] > y_max:
-                y_max = gate_coordinate[1]
-        # consider pad coordinates
-        for j in range(len(net_iter.connected_pad)):
-            pad_number = net_iter.connected_pad[j]
-            pad_iter: Pad = pad_list[pad_number-1]
-            pad_coordinate = pad_iter.coordinate
-            if pad_coordinate[0] < x_min:
-                x_min = pad_coordinate[0]
-            if pad_coordinate[0] > x_max:
-                x_max = pad_coordinate[0]
-            if pad_coordinate[1] < y_min:
-                y_min = pad_coordinate[1]
-            if pad_coordinate[1] > y_max:
-                y_max = pad_coordinate[1]
-
-        L += x_max - x_min + y_max - y_min
 
+def summation_of_HPWL(net_list, gate_list, pad_list):
+    L, net_HPWL = vectorized_HPWL(netlist_of(gate_list))
     return L
+
+
+def vectorized_HPWL(netlist, gate_coordinates=None):
+    # gate_coordinates is None for the current placement, a (N, 2) placement or a batch of K placements (K, N, 2).
+    # returns the total HPWL and the HPWL of every net, with a leading K axis for a batch
+    instrumentation.get_profiler().count("HPWL.evaluations")
+    if gate_coordinates is None:
+        xy = netlist.xy
+    else:
+        gate_coordinates = np.asarray(gate_coordinates, dtype=np.float64)
+        pad_xy = np.broadcast_to(netlist.pad_xy, gate_coordinates.shape[:-2] + netlist.pad_xy.shape)
+        xy = np.concatenate((gate_coordinates, pad_xy), axis=-2)
+
+    net_HPWL = np.zeros(xy.shape[:-2] + (netlist.num_nets,), dtype=np.float64)
+    # reduceat can not express empty segments, so nets without any pin are left at zero
+    nonempty = np.diff(netlist.net_pin_ptr) > 0
+    if not nonempty.any():
+        return net_HPWL.sum(axis=-1), net_HPWL
+    starts = netlist.net_pin_ptr[:-1][nonempty]
+    pin_xy = xy[..., netlist.net_pin_idx, :]
+    lower = np.minimum.reduceat(pin_xy, starts, axis=-2)
+    upper = np.maximum.reduceat(pin_xy, starts, axis=-2)
+    net_HPWL[..., nonempty] = (upper - lower).sum(axis=-1)
+    return net_HPWL.sum(axis=-1), net_HPWL
+
+
+class IncrementalHPWL:
+    # caches the bounding box of every net as [x_min, x_min_count, x_max, x_max_count,
+    # y_min, y_min_count, y_max, y_max_count] so that a move only touches the nets of the moved gates
+    def __init__(self, net_list, gate_list, pad_list):
+        self.net_list = net_list
+        self.gate_list = gate_list
+        self.pad_list = pad_list
+        self.netlist = netlist_of(gate_list)
+        self.boxes = []
+        self.net_HPWL = []
+        for i in range(len(net_list)):
+            box = self._compute_box(i)
+            self.boxes.append(box)
+            self.net_HPWL.append(self._box_HPWL(box))
+        self.total = sum(self.net_HPWL)
+        # state of the pending (proposed but not yet accepted or rejected) move
+        self._moved_gates = []
+        self._old_coordinates = []
+        self._saved_boxes = {}
+        self._pending_delta = 0
+
+    def _compute_box(self, net_idx):
+        netlist = self.netlist
+        pins = netlist.net_pin_idx[netlist.net_pin_ptr[net_idx]:netlist.net_pin_ptr[net_idx + 1]]
+        box = [inf, 0, -inf, 0, inf, 0, -inf, 0]
+        for x, y in netlist.xy[pins].tolist():
+            _add_pin(box, x, y)
+        return box
+
+    @staticmethod
+    def _box_HPWL(box):
+        if box[1] == 0:
+            # net without any pin
+            return 0
+        return box[2] - box[0] + box[6] - box[4]
+
+    def propose_swap(self, Gi: Gate, Gj: Gate):
+        if Gi is Gj:
+            return self.propose_move([], [])
+        gate_xy = self.netlist.gate_xy
+        return self.propose_move([Gi, Gj], [gate_xy[Gj.index].tolist(), gate_xy[Gi.index].tolist()])
+
+    def propose_move(self, gates, new_coordinates):
+        # moves the gates and returns the delta HPWL; must be followed by accept() or reject().
+        # every gate may appear only once, a second move of it would update the box counts twice
+        indices = [gate.index for gate in gates]
+        if len(set(indices)) != len(indices):
+            raise ValueError("gate moved more than once: " + str(indices))
+        gate_xy = self.netlist.gate_xy
+        self._moved_gates = list(gates)
+        self._old_coordinates = []
+        pin_moves = {}
+        for gate, new_coordinate in zip(gates, new_coordinates):
+            old_x, old_y = gate_xy[gate.index].tolist()
+            new_x, new_y = float(new_coordinate[0]), float(new_coordinate[1])
+            self._old_coordinates.append((old_x, old_y))
+            gate_xy[gate.index] = new_x, new_y
+            move = (old_x, old_y, new_x, new_y)
+            for net_idx in self.netlist.gate_nets(gate.index).tolist():
+                pin_moves.setdefault(net_idx, []).append(move)
+
+        self._saved_boxes = {}
+        delta = 0
+        for net_idx, moves in pin_moves.items():
+            box = self.boxes[net_idx]
+            self._saved_boxes[net_idx] = (box, self.net_HPWL[net_idx])
+            new_box = _move_pins(box, moves)
+            if new_box is None:
+                # a boundary lost its last pin, so the box has to be rebuilt from the net
+                new_box = self._compute_box(net_idx)
+            self.boxes[net_idx] = new_box
+            net_HPWL = self._box_HPWL(new_box)
+            delta += net_HPWL - self.net_HPWL[net_idx]
+            self.net_HPWL[net_idx] = net_HPWL
+        self._pending_delta = delta
+        return delta
+
+    def accept(self):
+        self.total += self._pending_delta
+        self._clear_pending()
+
+    def reject(self):
+        for gate, old_coordinate in zip(self._moved_gates, self._old_coordinates):
+            self.netlist.gate_xy[gate.index] = old_coordinate
+        for net_idx, (box, net_HPWL) in self._saved_boxes.items():
+            self.boxes[net_idx] = box
+            self.net_HPWL[net_idx] = net_HPWL
+        self._clear_pending()
+
+    def _clear_pending(self):
+        self._moved_gates = []
+        self._old_coordinates = []
+        self._saved_boxes = {}
+        self._pending_delta = 0
+
+
+def _add_pin(box, x, y):
+    if x < box[0]:
+        box[0] = x
+        box[1] = 1
+    elif x == box[0]:
+        box[1] += 1
+    if x > box[2]:
+        box[2] = x
+        box[3] = 1
+    elif x == box[2]:
+        box[3] += 1
+    if y < box[4]:
+        box[4] = y
+        box[5] = 1
+    elif y == box[4]:
+        box[5] += 1
+    if y > box[6]:
+        box[6] = y
+        box[7] = 1
+    elif y == box[6]:
+        box[7] += 1
+
+
+def _move_pins(box, moves):
+    # returns the updated copy of the box, or None when it can not be updated incrementally
+    box = box.copy()
+    # add the new pin positions first, so that removing the old ones never empties a boundary by mistake
+    for old_x, old_y, new_x, new_y in moves:
+        _add_pin(box, new_x, new_y)
+    for old_x, old_y, new_x, new_y in moves:
+        for value, idx in ((old_x, 0), (old_x, 2), (old_y, 4), (old_y, 6)):
+            if value == box[idx]:
+                box[idx + 1] -= 1
+                if box[idx + 1] == 0:
+                    return None
+    return box
@@ -1,216 +1,227 @@
+import heapq
 import math
+import sys
+import time
 
 from data_structures import *
 import parser
-import visualization
 import evaluations
 import numpy as np
-
-
-def is_all_moved(gate_list):
-    status_checker = 1
-    for i in range(len(gate_list)):
-        gate_iter: Gate = gate_list[i]
-        status_checker = status_checker * gate_iter.status
-    if status_checker == 1:
-        # all cell is moved
-        return 1
-    else:
-        # some cell is not moved
-        return 0
-
-
-def extract_maxDegree_unmoved_cell(gate_list):
-    idx = -1
-    max_degree = -1
-    consider_only_definition = 0
-    for i in range(len(gate_list)):
-        gate_iter: Gate = gate_list[i]
-        if consider_only_definition == 1:
-            if gate_iter.connectivity > max_degree and gate_iter.status == 0:
-                max_degree = gate_iter.connectivity
-                max_degree = gate_iter.connected_cell_number
-                idx = i
-        else:
-            # considering the connected cell number instead of the definition of node degree
-            if gate_iter.connected_cell_number > max_degree and gate_iter.status == 0:
-                max_degree = gate_iter.connected_cell_number
-                idx = i
-
-    return gate_list[idx]
+from repulsion import repulsive_forces as get_repulsive_forces
+from trace_recorder import TraceRecorder
+from legalization import legalize_and_refine
+from legalization import legalize, slot_grid_for, SlotGrid
+from net_models import segment_members
+import instrumentation
 
 
 def ZFT_position(gate: Gate, gate_list, net_list, pad_list):
-    connected_nets = gate.connected_nets
-    sigma_cx = 0
-    sigma_cy = 0
+    # sum of the pin coordinates of all nets of the gate over its connected cell number (all weights 1)
+    netlist = netlist_of(gate_list)
+    nets = netlist.gate_nets(gate.index)
+    owners, positions = segment_members(netlist.net_pin_ptr[nets], np.diff(netlist.net_pin_ptr)[nets])
     sigma_c = gate.connected_cell_number  # because the weights of edge are all 1
-
-    for i in range(len(connected_nets)):
-        net_i: Net = net_list[connected_nets[i] - 1]
-        for j in range(len(net_i.connected_gates)):
-            gate_i = gate_list[net_i.connected_gates[j] - 1]
-            xj = gate_i.coordinate[0]
-            yj = gate_i.coordinate[1]
-            sigma_cx += xj
-            sigma_cy += yj
-        for j in range(len(net_i.connected_pad)):
-            pad_i = pad_list[net_i.connected_pad[j] - 1]
-            xj = pad_i.coordinate[0]
-            yj = pad_i.coordinate[1]
-            sigma_cx += xj
-            sigma_cy += yj
-    xi = sigma_cx / sigma_c
-    yi = sigma_cy / sigma_c
+    xi, yi = (netlist.xy[netlist.net_pin_idx[positions]].sum(axis=0) / sigma_c).tolist()
 
     return [xi, yi]
 
 
-def relocate():
-    pass
-
-
-def forced_directed_placement(net_list, gate_list, pad_list):
-    # arbitrary initial placement is already completed.
+def relocate(grid: SlotGrid, slot, gate, moved, gate_slot, gate_xy):
+    # ripple move of gate into the occupied slot: an unmoved occupant is pushed to the free slot nearest to it and
+    # is placed properly on its own turn, a moved (locked) occupant keeps its slot and gate takes the nearest free
+    # slot instead. returns the slot of gate
+    occupant = int(grid.occupant[slot])
+    if moved[occupant]:
+        slot = grid.nearest_free(*grid.slot_xy[slot])
+    else:
+        ripple_slot = grid.nearest_free(*grid.slot_xy[slot])
+        grid.occupy(ripple_slot, occupant)
+        gate_slot[occupant] = ripple_slot
+        gate_xy[occupant] = grid.slot_xy[ripple_slot]
+    grid.occupy(slot, gate)
+    return slot
+
+
+def forced_directed_placement(net_list, gate_list, pad_list, observer=None, whitespace=0.2):
+    # the gates are kept on a slot grid with (1 + whitespace) slots per gate (legalization.SlotGrid), whose
+    # occupancy array answers "is the ZFT position free" in O(1). the unmoved gates wait in a heap keyed by their
+    # connected cell number, so every step costs O(log N) plus the ZFT sum
+    netlist = netlist_of(gate_list)
+    # arbitrary initial placement is already completed, it is snapped to the grid.
     # loc = LOCATIONS(p)
-    loc = []
-    for i in range(len(gate_list)):
-        gate_i = gate_list[i]
-        gate_coordinate = gate_i.coordinate.tolist()
-        loc.append(gate_coordinate)
+    grid = slot_grid_for(len(gate_list), whitespace)
+    legalize(gate_list, grid)
+    gate_slot = np.full(len(gate_list), -1, dtype=np.int64)
+    occupied = np.nonzero(grid.occupant >= 0)[0]
+    gate_slot[grid.occupant[occupied]] = occupied
     # status is also already set by unmoved
+    moved = np.zeros(len(gate_list), dtype=bool)
+    unmoved = [(-gate_list[i].connected_cell_number, i) for i in range(len(gate_list)) if gate_list[i].status == 0]
+    heapq.heapify(unmoved)
+    moved_count = len(gate_list) - len(unmoved)
 
     stop = 0
     N = 1
     # continue until all cells have been moved or some stopping criterion is reached
-    while (not is_all_moved(gate_list) and not stop):
+    while (moved_count < len(gate_list) and not stop):
         # c = MAX_DEGREE(V, status)
-        unmoved_max_degree_cell = extract_maxDegree_unmoved_cell(gate_list)
+        unmoved_max_degree_cell = gate_list[heapq.heappop(unmoved)[1]]
+        c = unmoved_max_degree_cell.index
         # ZFT_pos = ZFT_position(c)
         ZFT_pos = ZFT_position(unmoved_max_degree_cell, gate_list, net_list, pad_list)
 
+        grid.release(gate_slot[c])
+        slot = grid.slot(*grid.cell_of(*ZFT_pos))
         # if position is unoccupied,
-        if ZFT_pos not in loc:
+        if grid.occupant[slot] < 0:
             # move c to its ZFT position
-            unmoved_max_degree_cell.coordinate = ZFT_pos
-            loc[unmoved_max_degree_cell.id - 1] = ZFT_pos
+            grid.occupy(slot, c)
         else:
             # RELOCAE(c, loc)
-            relocate()
-            # temporal code
-            unmoved_max_degree_cell.coordinate = ZFT_pos
-            loc[unmoved_max_degree_cell.id - 1] = ZFT_pos
+            slot = relocate(grid, slot, c, moved, gate_slot, netlist.gate_xy)
+        gate_slot[c] = slot
+        unmoved_max_degree_cell.coordinate = grid.slot_xy[slot]
 
         # status[c] = MOVED
         unmoved_max_degree_cell.status = 1
+        moved[c] = True
+        moved_count += 1
         # visualization.draw_window(pad_list, gate_list, net_list, FD=1, remark=N)
-        visualization.draw_window(pad_list, gate_list, net_list)
+        if observer is not None:
+            observer(net_list, gate_list, pad_list, remark=N)
         N += 1
 
 
-def get_forces(net_list, gate_list, pad_list):
-    # get the all gate positions as numpy arrray
-    positions = np.zeros((len(gate_list), 2))
-    for i in range(len(gate_list)):
-        gate_i: Gate = gate_list[i]
-        coordinate = np.array(gate_i.coordinate)
-        positions[i] = coordinate
-
-    for i in range(len(gate_list)):
-
-        # print(i)
-        gate_i = gate_list[i]
-        force = np.zeros(2)
-        gate_i_coordinate = np.array(gate_i.coordinate)
-
-        # get the hook forces
-        # connected_cell_positions = np.zeros((len(gate_i.connected_cell_number), 2))
-        for j in range(len(gate_i.connected_nets)):
-            net_i: Net = net_list[gate_i.connected_nets[j] - 1]
-            for k in range(len(net_i.connected_gates)):
-                connected_gate_i: Gate = gate_list[net_i.connected_gates[k] - 1]
-                connected_gate_i_coordinate = np.array(connected_gate_i.coordinate)
-                force = force + (connected_gate_i_coordinate - gate_i_coordinate)
-            for k in range(len(net_i.connected_pad)):
-                connected_pad_i: Pad = pad_list[net_i.connected_pad[k] - 1]
-                connected_pad_i_coordinate = np.array(connected_pad_i.coordinate)
-                force = force + (connected_pad_i_coordinate - gate_i_coordinate)
-
-        # get the repulsive forces
-        repulsive_coefficient = 150 # this value should consider the number of cells
-        temp = np.ones((len(gate_list), 2)) * gate_i.coordinate
-        displacements = positions - temp
-        denominators = np.hypot(displacements[:, 0], displacements[:, 1]) ** 2
-        denominators = np.reshape(denominators, (len(gate_list), 1))
-        denominators = np.concatenate((denominators, denominators), axis=1)
-
-        repulsive_forces = -displacements / denominators
-
-        repulsive_force = np.nansum(repulsive_forces, axis=0) / ((len(gate_list)) / repulsive_coefficient)
-        force = force + repulsive_force
-
-        # force update
-        gate_i.force = force - 20 * gate_i.velocity  # consider the friction
-
-
-def move(net_list, gate_list, pad_list):
-    unit_time = 0.5
-    activity = 0
-    for i in range(len(gate_list)):
-        gate_i: Gate = gate_list[i]
-        # velocity update
-        gate_i.velocity = gate_i.velocity + (gate_i.force / gate_i.mass) * unit_time
-        # position update
-        gate_i.coordinate = gate_i.coordinate + gate_i.velocity * unit_time
-        if gate_i.coordinate[0] > 100:
-            gate_i.coordinate[0] = 100
-        if gate_i.coordinate[1] > 100:
-            gate_i.coordinate[1] = 100
-        if gate_i.coordinate[0] < 0:
-            gate_i.coordinate[0] = 0
-        if gate_i.coordinate[1] < 0:
-            gate_i.coordinate[1] = 0
-
-        # check activity
-        activity += gate_i.velocity
-    activity /= len(gate_list)
+def get_spring_forces(netlist):
+    # the hook force of gate i is the sum over its nets of (sum of the net's pin coordinates - net size * x_i),
+    # i.e. B^T (B_gate x_gate + B_pad x_pad) - connected_cell_number * x_i with the net incidence matrices B
+    gate_incidence, pad_incidence = netlist.incidence_matrices()
+    net_sums = gate_incidence @ netlist.gate_xy + pad_incidence @ netlist.pad_xy
+    return gate_incidence.T @ net_sums - netlist.connected_cell_number[:, None] * netlist.gate_xy
+
+
+def get_forces(net_list, gate_list, pad_list, repulsion="barnes_hut", theta=0.5):
+    # repulsion is "exact", "grid" or "barnes_hut", see repulsion.repulsive_forces
+    netlist = netlist_of(gate_list)
+    profiler = instrumentation.get_profiler()
+
+    # get the hook forces
+    with profiler.timer("FD.spring_forces"):
+        forces = get_spring_forces(netlist)
+
+    # get the repulsive forces
+    repulsive_coefficient = 150  # this value should consider the number of cells
+    with profiler.timer("FD.repulsive_forces"):
+        repulsive_forces = get_repulsive_forces(netlist.gate_xy, method=repulsion, theta=theta)
+    forces += repulsive_forces / ((len(gate_list)) / repulsive_coefficient)
+
+    # force update
+    netlist.gate_force[:] = forces - 20 * netlist.gate_velocity  # consider the friction
+
+
+def move(net_list, gate_list, pad_list, unit_time=0.5):
+    netlist = netlist_of(gate_list)
+    # velocity update
+    netlist.gate_velocity += (netlist.gate_force / netlist.gate_mass[:, None]) * unit_time
+    # position update
+    netlist.gate_xy += netlist.gate_velocity * unit_time
+    np.clip(netlist.gate_xy, 0, 100, out=netlist.gate_xy)
+
+    # check activity
+    activity = netlist.gate_velocity.mean(axis=0)
     return activity
 
 
-def forced_directed_placement_with_repulsive_force(net_list, gate_list, pad_list):
+def kinetic_energy(netlist):
+    return 0.5 * np.sum(netlist.gate_mass[:, None] * netlist.gate_velocity ** 2)
+
+
+def forced_directed_placement_with_repulsive_force(net_list, gate_list, pad_list, repulsion="barnes_hut", theta=0.5,
+                                                   max_iterations=300, unit_time=0.5, min_unit_time=0.05,
+                                                   max_unit_time=2.0, energy_tolerance=1e-4, HPWL_tolerance=1e-4,
+                                                   patience=20, observer=None, trace=None):
+    # observer(net_list, gate_list, pad_list, remark=N) is called after every iteration, e.g.
+    # visualization.renderer(path="FD_images"); without it nothing is rendered.
+    # runs until the mean kinetic energy per gate drops below energy_tolerance, or the HPWL improved by less than
+    # HPWL_tolerance (relative) over the last patience iterations, or max_iterations is reached.
+    # unit_time grows by 10% while the kinetic energy falls and is halved when it rises again (oscillation).
+    # trace, a TraceRecorder with the columns HPWL, energy and unit_time, records every iteration
+    netlist = netlist_of(gate_list)
     N = 0
     HPWL_list = []
-    # while True:
-    for i in range(300):
-        print(i)
-        get_forces(net_list, gate_list, pad_list)
-        activity = move(net_list, gate_list, pad_list)
+    previous_energy = np.inf
+    converged = False
+    profiler = instrumentation.get_profiler()
+    for i in range(max_iterations):
+        iteration_start = time.perf_counter()
+        get_forces(net_list, gate_list, pad_list, repulsion=repulsion, theta=theta)
+        with profiler.timer("FD.move"):
+            activity = move(net_list, gate_list, pad_list, unit_time=unit_time)
         # visualization.draw_window(pad_list, gate_list, net_list, FD=1, remark=N)
-        visualization.draw_window(pad_list, gate_list, net_list, remark=N, path="FD_images")
+        if observer is not None:
+            observer(net_list, gate_list, pad_list, remark=N)
         HPWL = evaluations.summation_of_HPWL(net_list, gate_list, pad_list)
         HPWL_list.append(HPWL)
-        print(HPWL)
-        # if len(HPWL_list) > 10:
-        #     if HPWL_list[-4] - HPWL_list[-1] < HPWL_list[1] - HPWL_list[2] / 10000:
-        #         break
         N += 1
 
-
-def main():
+        # adapt the time step
+        energy = kinetic_energy(netlist)
+        if energy > previous_energy:
+            unit_time = max(unit_time * 0.5, min_unit_time)
+        else:
+            unit_time = min(unit_time * 1.1, max_unit_time)
+        previous_energy = energy
+        if trace is not None:
+            trace.record(HPWL, energy, unit_time)
+        profiler.count("FD.iterations")
+        profiler.record("FD", HPWL=HPWL, energy=energy, unit_time=unit_time,
+                        iteration_time=time.perf_counter() - iteration_start)
+
+        # stopping criteria
+        if energy / len(gate_list) < energy_tolerance:
+            converged = True
+            break
+        if len(HPWL_list) > patience:
+            improvement = HPWL_list[-patience - 1] - HPWL_list[-1]
+            if improvement < HPWL_tolerance * HPWL_list[-patience - 1]:
+                converged = True
+                break
+
+    if trace is not None:
+        trace.flush()
+    profiler.count("FD.converged" if converged else "FD.not_converged")
+    return {"iterations": N, "converged": converged, "HPWL": HPWL_list, "unit_time": unit_time,
+            "activity": activity}
+
+
+def main(headless=False):
     benchmarks = ["benchmarks/toy1", "benchmarks/toy2", "benchmarks/primary1", "benchmarks/fract", "benchmarks/struct",
                   "benchmarks/biomed"]
 
 
     net_list, gate_list, pad_list = parser.parser("benchmarks/struct")
     print(evaluations.summation_of_HPWL(net_list, gate_list, pad_list))
-    visualization.draw_window(pad_list, gate_list, net_list, ver="FD1")
-    # forced_directed_placement(net_list, gate_list, pad_list)
-    forced_directed_placement_with_repulsive_force(net_list, gate_list, pad_list)
-    visualization.draw_window(pad_list, gate_list, net_list, ver="FD2")
+    observer = None
+    if not headless:
+        import visualization
+        visualization.draw_window(pad_list, gate_list, net_list, ver="FD1")
+        from frame_pipeline import FrameWriter
+        frames = FrameWriter("FD_images/Animation.gif", fps=20, scale=0.5)
+        observer = visualization.renderer(path="FD_images", frames=frames)
+    # forced_directed_placement(net_list, gate_list, pad_list, observer=observer)
+    trace = TraceRecorder(columns=("HPWL", "energy", "unit_time"), path="HPWL_list_FD.csv")
+    result = forced_directed_placement_with_repulsive_force(net_list, gate_list, pad_list, observer=observer,
+                                                            trace=trace)
+    print("FD stopped after", result["iterations"], "iterations, converged:", result["converged"])
+    print(evaluations.summation_of_HPWL(net_list, gate_list, pad_list))
+    result = legalize_and_refine(net_list, gate_list, pad_list)
+    print("legalized HPWL:", result["legal_HPWL"], "detailed placement HPWL:", result["detailed_HPWL"])
+    if not headless:
+        visualization.draw_window(pad_list, gate_list, net_list, ver="FD2")
+        visualization.pygame_quit(save_image=1, frames=frames)
     print(evaluations.summation_of_HPWL(net_list, gate_list, pad_list))
 
 
 if __name__ == "__main__":
-    main()
-    visualization.pygame_quit(save_image=1)
+    main(headless="--headless" in sys.argv)
     print("end")
@@ -0,0 +1,75 @@
+import os
+import queue
+import threading
+
+import imageio
+import pygame
+
+
+class FrameWriter:
+    # animation frames without the PNG round trip: submit() copies every every-th surface, downscaled by scale,
+    # into a bounded queue, and a background thread streams the frames into an imageio writer (a .gif, or a video
+    # such as .mp4 through imageio-ffmpeg), so only queue_size frames are ever held in memory.
+    # a full queue blocks the placer until the writer catches up, or drops the frame with drop=True
+    def __init__(self, path, fps=20, every=1, scale=1.0, queue_size=16, drop=False):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if path.lower().endswith(".gif"):
+            # the pillow GIF writer takes the frame duration in milliseconds
+            self.writer = imageio.get_writer(path, mode="I", duration=1000 / fps, loop=0)
+        else:
+            self.writer = imageio.get_writer(path, mode="I", fps=fps)
+        self.path = path
+        self.every = max(1, int(every))
+        self.scale = scale
+        self.drop = drop
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.error = None
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.thread = threading.Thread(target=self._write_frames, daemon=True)
+        self.thread.start()
+
+    def submit(self, surface):
+        self.submitted += 1
+        if (self.submitted - 1) % self.every:
+            return
+        if self.error is not None:
+            raise self.error
+        if self.scale != 1.0:
+            width, height = surface.get_size()
+            surface = pygame.transform.smoothscale(surface, (max(1, int(width * self.scale)),
+                                                             max(1, int(height * self.scale))))
+        # surfarray is indexed (x, y), the writers expect rows first
+        frame = pygame.surfarray.array3d(surface).swapaxes(0, 1)
+        if self.drop:
+            try:
+                self.frames.put_nowait(frame)
+            except queue.Full:
+                self.dropped += 1
+        else:
+            self.frames.put(frame)
+
+    def _write_frames(self):
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                break
+            if self.error is not None:
+                # keep draining so that submit() never blocks on a dead writer
+                continue
+            try:
+                self.writer.append_data(frame)
+                self.written += 1
+            except Exception as error:
+                self.error = error
+
+    def close(self):
+        # waits for the queued frames and finishes the file
+        self.frames.put(None)
+        self.thread.join()
+        self.writer.close()
+        if self.error is not None:
+            raise self.error
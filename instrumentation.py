@@ -0,0 +1,101 @@
+import contextlib
+import json
+import time
+
+# named timers, counters and per-iteration series that the placers report into. the module-global profiler is a
+# no-op until enable() is called, so instrumented code only pays an attribute lookup and an empty call; hot loops
+# fetch it once with get_profiler() and report in bulk (e.g. once per SA temperature, not once per move).
+
+
+class Profiler:
+    enabled = True
+
+    def __init__(self):
+        self.timers = {}  # name -> [total seconds, calls]
+        self.counters = {}
+        self.series = {}  # name -> list of rows (dicts)
+        self.start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        timer = self.timers.setdefault(name, [0.0, 0])
+        timer[0] += seconds
+        timer[1] += 1
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def record(self, name, **values):
+        values.setdefault("time", time.perf_counter() - self.start)
+        self.series.setdefault(name, []).append(values)
+
+    def summary(self):
+        return {"elapsed": time.perf_counter() - self.start,
+                "timers": {name: {"total": total, "calls": calls, "mean": total / calls}
+                           for name, (total, calls) in self.timers.items()},
+                "counters": dict(self.counters)}
+
+    def export(self, path, series=True):
+        # JSON summary, with the per-iteration series unless series=False
+        data = self.summary()
+        if series:
+            data["series"] = self.series
+        with open(path, "w") as file:
+            json.dump(data, file, indent=1, default=float)
+
+
+class NullProfiler:
+    enabled = False
+    _null_timer = contextlib.nullcontext()
+
+    def timer(self, name):
+        return self._null_timer
+
+    def add_time(self, name, seconds):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+    def record(self, name, **values):
+        pass
+
+    def summary(self):
+        return {"elapsed": 0.0, "timers": {}, "counters": {}}
+
+    def export(self, path, series=True):
+        # the empty summary, so that a profile file exists whether or not profiling was enabled
+        data = self.summary()
+        if series:
+            data["series"] = {}
+        with open(path, "w") as file:
+            json.dump(data, file, indent=1)
+
+
+_profiler = NullProfiler()
+
+
+def get_profiler():
+    return _profiler
+
+
+def enable():
+    # starts a new profiler and returns it
+    global _profiler
+    _profiler = Profiler()
+    return _profiler
+
+
+def disable():
+    # returns the profiler that was active
+    global _profiler
+    profiler = _profiler
+    _profiler = NullProfiler()
+    return profiler
@@ -0,0 +1,220 @@
+import math
+
+import numpy as np
+
+from data_structures import netlist_of
+from evaluations import IncrementalHPWL
+from evaluations import summation_of_HPWL
+import instrumentation
+
+
+class SlotGrid:
+    # columns x rows legal slots over the region [lower, upper], slot s = column * rows + row, placed at the cell
+    # centers. occupant[s] is the gate in slot s or -1, so finding a free slot never scans the gates
+    def __init__(self, columns, rows, lower=(0, 0), upper=(100, 100)):
+        self.columns = int(columns)
+        self.rows = int(rows)
+        self.lower = np.asarray(lower, dtype=np.float64)
+        self.upper = np.asarray(upper, dtype=np.float64)
+        self.cell = (self.upper - self.lower) / (self.columns, self.rows)
+        column, row = np.meshgrid(np.arange(self.columns), np.arange(self.rows), indexing="ij")
+        self.slot_column = column.ravel()
+        self.slot_row = row.ravel()
+        self.slot_xy = self.lower + (np.column_stack((self.slot_column, self.slot_row)) + 0.5) * self.cell
+        self.occupant = np.full(self.columns * self.rows, -1, dtype=np.int64)
+        self.free_slots = self.columns * self.rows
+        self._ring_offsets = []
+
+    def cell_of(self, x, y):
+        column = min(max(int((x - self.lower[0]) / self.cell[0]), 0), self.columns - 1)
+        row = min(max(int((y - self.lower[1]) / self.cell[1]), 0), self.rows - 1)
+        return column, row
+
+    def slot(self, column, row):
+        return column * self.rows + row
+
+    def occupy(self, slot, gate):
+        if self.occupant[slot] < 0:
+            self.free_slots -= 1
+        self.occupant[slot] = gate
+
+    def release(self, slot):
+        if self.occupant[slot] >= 0:
+            self.free_slots += 1
+        self.occupant[slot] = -1
+
+    def ring(self, column, row, radius):
+        # slots at Chebyshev distance radius from the cell (column, row), clipped to the grid
+        while len(self._ring_offsets) <= radius:
+            r = len(self._ring_offsets)
+            side = np.arange(-r, r + 1)
+            if r == 0:
+                offsets = np.zeros((1, 2), dtype=np.int64)
+            else:
+                offsets = np.concatenate((np.column_stack((side, np.full(len(side), -r))),
+                                          np.column_stack((side, np.full(len(side), r))),
+                                          np.column_stack((np.full(len(side) - 2, -r), side[1:-1])),
+                                          np.column_stack((np.full(len(side) - 2, r), side[1:-1]))))
+            self._ring_offsets.append(offsets)
+        columns = self._ring_offsets[radius][:, 0] + column
+        rows = self._ring_offsets[radius][:, 1] + row
+        inside = (columns >= 0) & (columns < self.columns) & (rows >= 0) & (rows < self.rows)
+        return columns[inside] * self.rows + rows[inside]
+
+    def window(self, column, row, radius):
+        # all slots within Chebyshev distance radius of the cell (column, row)
+        columns = np.arange(max(column - radius, 0), min(column + radius + 1, self.columns))
+        rows = np.arange(max(row - radius, 0), min(row + radius + 1, self.rows))
+        return (columns[:, None] * self.rows + rows[None, :]).ravel()
+
+    def nearest_free(self, x, y):
+        # free slot closest to (x, y), searched ring by ring around its cell until no further ring can be closer
+        if self.free_slots == 0:
+            raise ValueError("no free slot left in the %d x %d grid" % (self.columns, self.rows))
+        column, row = self.cell_of(x, y)
+        best_slot = -1
+        best_distance = math.inf
+        radius = 0
+        while radius <= max(self.columns, self.rows):
+            if (radius - 1) * self.cell.min() > best_distance:
+                break
+            slots = self.ring(column, row, radius)
+            slots = slots[self.occupant[slots] < 0]
+            if len(slots):
+                distance = np.hypot(self.slot_xy[slots, 0] - x, self.slot_xy[slots, 1] - y)
+                k = int(np.argmin(distance))
+                if distance[k] < best_distance:
+                    best_distance = distance[k]
+                    best_slot = int(slots[k])
+            radius += 1
+        return best_slot
+
+
+def slot_grid_for(num_gates, whitespace=0.2, lower=(0, 0), upper=(100, 100)):
+    # square grid with at least (1 + whitespace) slots per gate
+    side = max(1, int(math.ceil(math.sqrt(num_gates * (1 + whitespace)))))
+    return SlotGrid(side, side, lower, upper)
+
+
+def spread_positions(gate_xy, grid):
+    # rank based spreading of a clustered global placement over the grid: the gates are cut into columns of equal
+    # size by x, and the gates of a column are spread over its rows by y, keeping their relative order
+    targets = np.empty_like(gate_xy)
+    by_x = np.lexsort((gate_xy[:, 1], gate_xy[:, 0]))
+    for column, members in enumerate(np.array_split(by_x, grid.columns)):
+        if len(members) == 0:
+            continue
+        members = members[np.lexsort((gate_xy[members, 0], gate_xy[members, 1]))]
+        rows = (np.arange(len(members)) + 0.5) * grid.rows / len(members)
+        targets[members, 0] = grid.lower[0] + (column + 0.5) * grid.cell[0]
+        targets[members, 1] = grid.lower[1] + rows * grid.cell[1]
+    return targets
+
+
+def legalize(gate_list, grid=None, whitespace=0.2, spread=False):
+    # Tetris legalization: gates in the order of their x coordinate each take the free slot nearest to their
+    # global placement position, or with spread=True nearest to their spread_positions (for placements that are
+    # clustered far below the slot pitch, e.g. quadratic placement). returns the grid with its occupancy and the
+    # total displacement from the global placement
+    netlist = netlist_of(gate_list)
+    if grid is None:
+        grid = slot_grid_for(netlist.num_gates, whitespace)
+    if grid.free_slots < netlist.num_gates:
+        raise ValueError("%d gates do not fit into %d free slots" % (netlist.num_gates, grid.free_slots))
+    gate_xy = netlist.gate_xy
+    targets = spread_positions(gate_xy, grid) if spread else gate_xy.copy()
+    displacement = 0.0
+    for gate in np.lexsort((targets[:, 1], targets[:, 0])).tolist():
+        x, y = targets[gate].tolist()
+        slot = grid.nearest_free(x, y)
+        grid.occupy(slot, gate)
+        displacement += math.hypot(*(grid.slot_xy[slot] - gate_xy[gate]))
+        gate_xy[gate] = grid.slot_xy[slot]
+    return grid, displacement
+
+
+def optimal_position(netlist, gate):
+    # median of the bounding box bounds of the gate's nets without the gate itself, where its HPWL is minimal
+    xs = []
+    ys = []
+    xy = netlist.xy
+    for net in netlist.gate_nets(gate).tolist():
+        pins = netlist.net_pin_idx[netlist.net_pin_ptr[net]:netlist.net_pin_ptr[net + 1]]
+        pins = pins[pins != gate]
+        if len(pins) == 0:
+            continue
+        pin_xy = xy[pins]
+        lower = pin_xy.min(axis=0)
+        upper = pin_xy.max(axis=0)
+        xs += [lower[0], upper[0]]
+        ys += [lower[1], upper[1]]
+    if not xs:
+        return None
+    return float(np.median(xs)), float(np.median(ys))
+
+
+def detailed_placement(net_list, gate_list, pad_list, grid, window=1, passes=2):
+    # greedy local improvement of a legal placement: for every gate the slots within window cells of its slot and
+    # of its optimal position are tried, swapping with the occupant or moving into a free slot, and the best
+    # improving move is applied. stops after passes passes or a pass without improvement; returns the HPWL gain
+    netlist = netlist_of(gate_list)
+    hpwl = IncrementalHPWL(net_list, gate_list, pad_list)
+    gate_slot = np.full(netlist.num_gates, -1, dtype=np.int64)
+    occupied = np.nonzero(grid.occupant >= 0)[0]
+    gate_slot[grid.occupant[occupied]] = occupied
+    initial = hpwl.total
+
+    for pass_number in range(passes):
+        improved = 0
+        for gate in range(netlist.num_gates):
+            slot = int(gate_slot[gate])
+            candidates = [grid.window(grid.slot_column[slot], grid.slot_row[slot], window)]
+            target = optimal_position(netlist, gate)
+            if target is not None:
+                candidates.append(grid.window(*grid.cell_of(*target), window))
+            best_delta = 0
+            best_slot = -1
+            for candidate in np.unique(np.concatenate(candidates)).tolist():
+                if candidate == slot:
+                    continue
+                other = int(grid.occupant[candidate])
+                if other >= 0:
+                    delta = hpwl.propose_swap(gate_list[gate], gate_list[other])
+                else:
+                    delta = hpwl.propose_move([gate_list[gate]], [grid.slot_xy[candidate]])
+                hpwl.reject()
+                if delta < best_delta - 1e-9:
+                    best_delta = delta
+                    best_slot = candidate
+            if best_slot < 0:
+                continue
+
+            other = int(grid.occupant[best_slot])
+            if other >= 0:
+                hpwl.propose_swap(gate_list[gate], gate_list[other])
+                gate_slot[other] = slot
+                grid.occupy(slot, other)
+            else:
+                hpwl.propose_move([gate_list[gate]], [grid.slot_xy[best_slot]])
+                grid.release(slot)
+            hpwl.accept()
+            grid.occupy(best_slot, gate)
+            gate_slot[gate] = best_slot
+            improved += 1
+        if improved == 0:
+            break
+    return initial - hpwl.total
+
+
+def legalize_and_refine(net_list, gate_list, pad_list, whitespace=0.2, spread=False, window=1, passes=2):
+    # legalization and detailed placement after a global placer, returns the HPWL of every stage
+    profiler = instrumentation.get_profiler()
+    global_HPWL = summation_of_HPWL(net_list, gate_list, pad_list)
+    with profiler.timer("legalize"):
+        grid, displacement = legalize(gate_list, whitespace=whitespace, spread=spread)
+    legal_HPWL = summation_of_HPWL(net_list, gate_list, pad_list)
+    with profiler.timer("detailed_placement"):
+        detailed_placement(net_list, gate_list, pad_list, grid, window=window, passes=passes)
+    detailed_HPWL = summation_of_HPWL(net_list, gate_list, pad_list)
+    return {"global_HPWL": global_HPWL, "legal_HPWL": legal_HPWL, "detailed_HPWL": detailed_HPWL,
+            "displacement": displacement, "grid": grid}
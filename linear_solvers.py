@@ -0,0 +1,99 @@
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy.sparse import diags, tril, triu
+from scipy.sparse.linalg import spsolve, spsolve_triangular, cg, LinearOperator
+
+import instrumentation
+
+
+def jacobi_preconditioner(A):
+    diagonal = A.diagonal()
+    diagonal[diagonal == 0] = 1
+    inverse = 1 / diagonal
+    return LinearOperator(A.shape, matvec=lambda r: inverse * r, dtype=np.float64)
+
+
+def ssor_preconditioner(A):
+    # symmetric Gauss-Seidel, M = (D + L) D^-1 (D + U). scipy has no incomplete Cholesky, this is the zero fill
+    # factorization built from the triangles of A itself and, unlike a thresholded ILU, it stays SPD for CG
+    # a zero diagonal (a gate on no net and no pad) would make the triangular solves singular, as in
+    # jacobi_preconditioner it is replaced by 1
+    diagonal = A.diagonal()
+    A = A + diags((diagonal == 0).astype(np.float64))
+    diagonal[diagonal == 0] = 1
+    lower = tril(A, format="csr")
+    upper = triu(A, format="csr")
+
+    def apply(r):
+        y = spsolve_triangular(lower, r, lower=True)
+        return spsolve_triangular(upper, diagonal * y, lower=False)
+
+    return LinearOperator(A.shape, matvec=apply, dtype=np.float64)
+
+
+def amg_preconditioner(A):
+    try:
+        import pyamg
+    except ImportError:
+        raise ImportError("the 'amg' preconditioner needs the optional pyamg package")
+    return pyamg.smoothed_aggregation_solver(A.tocsr()).aspreconditioner(cycle="V")
+
+
+preconditioners = {
+    "none": lambda A: None,
+    "jacobi": jacobi_preconditioner,
+    "ssor": ssor_preconditioner,
+    "amg": amg_preconditioner,
+}
+
+
+def conjugate_gradient(A, b, x0=None, M=None, tol=1e-6, max_iterations=None):
+    try:
+        x, info = cg(A, b, x0=x0, rtol=tol, maxiter=max_iterations, M=M)
+    except TypeError:
+        # scipy < 1.12 calls the relative tolerance 'tol'
+        x, info = cg(A, b, x0=x0, tol=tol, maxiter=max_iterations, M=M)
+    # info > 0: not converged within max_iterations, info < 0: breakdown. the solution is still returned, but
+    # the caller is warned and the profiler counts it
+    profiler = instrumentation.get_profiler()
+    profiler.count("CG.solves")
+    if info != 0:
+        profiler.count("CG.not_converged")
+        reason = "did not converge in %d iterations" % info if info > 0 else "broke down (info %d)" % info
+        warnings.warn("conjugate gradient " + reason + ", the placement is not the exact optimum", RuntimeWarning)
+    return x
+
+
+def solve_placement(A, b, x0=None, method="direct", preconditioner="jacobi", tol=1e-6, max_iterations=None,
+                    parallel=False):
+    # solves A x = b[:, 0] and A y = b[:, 1]. A is one matrix shared by both dimensions or a pair (A_x, A_y),
+    # x0 is the (n, 2) warm start of the iterative methods, usually the current gate coordinates
+    if isinstance(A, (tuple, list)):
+        A_x, A_y = A
+    else:
+        A_x = A_y = A
+    if method == "direct":
+        if A_x is A_y:
+            return np.reshape(spsolve(A_x.tocsc(), b, permc_spec="MMD_AT_PLUS_A"), (-1, 2))
+        return np.column_stack((spsolve(A_x.tocsc(), b[:, 0], permc_spec="MMD_AT_PLUS_A"),
+                                spsolve(A_y.tocsc(), b[:, 1], permc_spec="MMD_AT_PLUS_A")))
+    if method != "cg":
+        raise ValueError("unknown solver method: " + str(method))
+    if preconditioner not in preconditioners:
+        raise ValueError("unknown preconditioner: " + str(preconditioner))
+
+    M_x = preconditioners[preconditioner](A_x)
+    M_y = M_x if A_x is A_y else preconditioners[preconditioner](A_y)
+
+    def solve_dimension(d):
+        A_d, M_d = (A_x, M_x) if d == 0 else (A_y, M_y)
+        return conjugate_gradient(A_d, b[:, d], None if x0 is None else x0[:, d], M_d, tol, max_iterations)
+
+    if parallel:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            x, y = executor.map(solve_dimension, (0, 1))
+    else:
+        x, y = solve_dimension(0), solve_dimension(1)
+    return np.column_stack((x, y))
@@ -0,0 +1,256 @@
+import math
+import sys
+from collections import deque
+
+import numpy as np
+
+from data_structures import netlist_of
+from net_models import segment_members
+import instrumentation
+
+# min-cut placement: the die is bisected recursively, alternately by the longer side, and the gates of every region
+# are split between the two halves by Fiduccia-Mattheyses partitioning. pins outside the region (pads and gates of
+# other regions at their current region centers) are terminal propagated: they are fixed on the side of the cut
+# line they lie on, so that the partition pulls connected gates towards them. regions are processed level by level
+# and the cut line is placed in proportion to the sizes of the two sides, so the gate density stays uniform.
+
+
+def fm_bipartition(cell_nets, net_cells, fixed, side, min_size, max_size, passes=8):
+    # cell_nets[c] / net_cells[n]: local incidence lists, fixed[n] = [fixed pins on side 0, on side 1],
+    # side: initial side of every cell (changed in place). a pass moves every cell at most once, always the free
+    # cell of highest gain whose move keeps both sides within [min_size, max_size], keeping the gains in buckets
+    # (one set per gain value and side, with a pointer to the highest non-empty bucket), and is then rolled back
+    # to its best prefix. returns the cut size
+    num_cells = len(cell_nets)
+    count = [[fixed[n][0], fixed[n][1]] for n in range(len(net_cells))]
+    for c in range(num_cells):
+        for n in cell_nets[c]:
+            count[n][side[c]] += 1
+    size = [side.count(0), side.count(1)]
+    max_gain = max([len(nets) for nets in cell_nets] + [1])
+
+    for pass_number in range(passes):
+        gain = [0] * num_cells
+        for c in range(num_cells):
+            F = side[c]
+            g = 0
+            for n in cell_nets[c]:
+                if count[n][F] == 1:
+                    g += 1
+                if count[n][1 - F] == 0:
+                    g -= 1
+            gain[c] = g
+        buckets = [[set() for g in range(2 * max_gain + 1)] for s in range(2)]
+        top = [0, 0]
+        for c in range(num_cells):
+            buckets[side[c]][gain[c] + max_gain].add(c)
+        for s in range(2):
+            top[s] = 2 * max_gain
+            while top[s] > 0 and not buckets[s][top[s]]:
+                top[s] -= 1
+        locked = [False] * num_cells
+
+        moves = []
+        total = 0
+        best_total = 0
+        best_length = 0
+        best_imbalance = abs(size[0] - size[1])
+        while True:
+            # highest gain move that keeps the balance
+            c = -1
+            for F in (0, 1):
+                if size[F] - 1 < min_size[F] or size[1 - F] + 1 > max_size[1 - F] or not buckets[F][top[F]]:
+                    continue
+                if c < 0 or top[F] > gain[c] + max_gain or (top[F] == gain[c] + max_gain and size[F] > size[side[c]]):
+                    c = next(iter(buckets[F][top[F]]))
+            if c < 0:
+                break
+            F = side[c]
+            T = 1 - F
+            buckets[F][gain[c] + max_gain].discard(c)
+            locked[c] = True
+            total += gain[c]
+
+            # gain updates of the free cells on the nets of c
+            for n in cell_nets[c]:
+                if count[n][T] == 0:
+                    for d in net_cells[n]:
+                        if not locked[d]:
+                            _move_bucket(buckets, top, gain, side, d, 1, max_gain)
+                elif count[n][T] == 1:
+                    for d in net_cells[n]:
+                        if not locked[d] and side[d] == T:
+                            _move_bucket(buckets, top, gain, side, d, -1, max_gain)
+                count[n][F] -= 1
+                count[n][T] += 1
+                if count[n][F] == 0:
+                    for d in net_cells[n]:
+                        if not locked[d]:
+                            _move_bucket(buckets, top, gain, side, d, -1, max_gain)
+                elif count[n][F] == 1:
+                    for d in net_cells[n]:
+                        if not locked[d] and side[d] == F:
+                            _move_bucket(buckets, top, gain, side, d, 1, max_gain)
+            side[c] = T
+            size[F] -= 1
+            size[T] += 1
+            moves.append(c)
+            for s in range(2):
+                while top[s] > 0 and not buckets[s][top[s]]:
+                    top[s] -= 1
+
+            imbalance = abs(size[0] - size[1])
+            if total > best_total or (total == best_total and imbalance < best_imbalance):
+                best_total = total
+                best_length = len(moves)
+                best_imbalance = imbalance
+
+        # roll back to the best prefix of the pass
+        for c in reversed(moves[best_length:]):
+            F = side[c]
+            T = 1 - F
+            for n in cell_nets[c]:
+                count[n][F] -= 1
+                count[n][T] += 1
+            side[c] = T
+            size[F] -= 1
+            size[T] += 1
+        if best_length == 0:
+            break
+
+    return sum(1 for n in range(len(net_cells)) if count[n][0] and count[n][1])
+
+
+def _move_bucket(buckets, top, gain, side, cell, delta, max_gain):
+    s = side[cell]
+    buckets[s][gain[cell] + max_gain].discard(cell)
+    gain[cell] += delta
+    buckets[s][gain[cell] + max_gain].add(cell)
+    if gain[cell] + max_gain > top[s]:
+        top[s] = gain[cell] + max_gain
+
+
+def region_hypergraph(netlist, cells, axis, cut):
+    # local incidence of the region's gates and the terminals of its nets, projected onto the two sides of the
+    # line axis = cut
+    local = np.full(netlist.num_gates, -1, dtype=np.int64)
+    local[cells] = np.arange(len(cells))
+    owners, positions = segment_members(netlist.gate_net_ptr[cells], np.diff(netlist.gate_net_ptr)[cells])
+    pairs = np.unique(owners * netlist.num_nets + netlist.gate_net_idx[positions])
+    pair_cells = pairs // netlist.num_nets
+    nets, pair_nets = np.unique(pairs % netlist.num_nets, return_inverse=True)
+
+    cell_nets = [[] for c in range(len(cells))]
+    net_cells = [[] for n in range(len(nets))]
+    for c, n in zip(pair_cells.tolist(), pair_nets.tolist()):
+        cell_nets[c].append(n)
+        net_cells[n].append(c)
+
+    # every pin of these nets that is not a gate of the region is a terminal
+    pin_owners, pin_positions = segment_members(netlist.net_pin_ptr[nets], np.diff(netlist.net_pin_ptr)[nets])
+    pins = netlist.net_pin_idx[pin_positions]
+    outside = np.ones(len(pins), dtype=bool)
+    is_gate = pins < netlist.num_gates
+    outside[is_gate] = local[pins[is_gate]] < 0
+    upper = netlist.xy[pins[outside], axis] >= cut
+    fixed = np.zeros((len(nets), 2), dtype=np.int64)
+    np.add.at(fixed, (pin_owners[outside], upper.astype(np.int64)), 1)
+    return cell_nets, net_cells, fixed.tolist()
+
+
+def place_leaf(netlist, cells, lower, upper):
+    # the few gates of a leaf region on a small grid inside it, in the order of their current position
+    columns = int(math.ceil(math.sqrt(len(cells))))
+    rows = int(math.ceil(len(cells) / columns))
+    order = cells[np.lexsort((netlist.gate_xy[cells, 1], netlist.gate_xy[cells, 0]))]
+    k = np.arange(len(cells))
+    netlist.gate_xy[order, 0] = lower[0] + (k // rows + 0.5) * (upper[0] - lower[0]) / columns
+    netlist.gate_xy[order, 1] = lower[1] + (k % rows + 0.5) * (upper[1] - lower[1]) / rows
+
+
+def mincut_placement(net_list, gate_list, pad_list, leaf_size=4, passes=8, tolerance=0.1, lower=(0, 0),
+                     upper=(100, 100), observer=None):
+    # places the gates into the region [lower, upper]. the sides of a split may deviate from half of the region's
+    # gates by tolerance times the region size. observer(net_list, gate_list, pad_list, remark=level) is called
+    # after every level. returns {"levels", "regions", "cut"}: levels processed, regions split, total cut nets
+    netlist = netlist_of(gate_list)
+    profiler = instrumentation.get_profiler()
+    regions = deque([(np.arange(netlist.num_gates), np.array(lower, dtype=np.float64),
+                      np.array(upper, dtype=np.float64), 0)])
+    netlist.gate_xy[:] = (regions[0][1] + regions[0][2]) / 2
+    level = 0
+    splits = 0
+    total_cut = 0
+    while regions:
+        cells, region_lower, region_upper, region_level = regions.popleft()
+        if region_level > level:
+            if observer is not None:
+                observer(net_list, gate_list, pad_list, remark=level)
+            level = region_level
+        if len(cells) <= leaf_size:
+            place_leaf(netlist, cells, region_lower, region_upper)
+            continue
+
+        # cut the longer side, terminals are projected onto its midline
+        extent = region_upper - region_lower
+        axis = 0 if extent[0] >= extent[1] else 1
+        middle = (region_lower[axis] + region_upper[axis]) / 2
+        with profiler.timer("mincut.hypergraph"):
+            cell_nets, net_cells, fixed = region_hypergraph(netlist, cells, axis, middle)
+
+        # the initial partition splits the gates at the median of their current coordinate
+        order = np.argsort(netlist.gate_xy[cells, axis], kind="stable")
+        side = [0] * len(cells)
+        for c in order[len(cells) // 2:].tolist():
+            side[c] = 1
+        half = len(cells) / 2
+        slack = max(1, int(tolerance * half))
+        min_size = [int(math.floor(half)) - slack, int(math.ceil(half)) - slack]
+        max_size = [int(math.floor(half)) + slack, int(math.ceil(half)) + slack]
+        with profiler.timer("mincut.fm"):
+            total_cut += fm_bipartition(cell_nets, net_cells, fixed, side, min_size, max_size, passes)
+        splits += 1
+
+        # the cut line divides the region in proportion to the two sides
+        side = np.array(side, dtype=bool)
+        cut = region_lower[axis] + extent[axis] * (np.count_nonzero(~side) / len(cells))
+        lower_upper = region_upper.copy()
+        lower_upper[axis] = cut
+        upper_lower = region_lower.copy()
+        upper_lower[axis] = cut
+        for members, child_lower, child_upper in ((cells[~side], region_lower, lower_upper),
+                                                  (cells[side], upper_lower, region_upper)):
+            netlist.gate_xy[members] = (child_lower + child_upper) / 2
+            regions.append((members, child_lower, child_upper, region_level + 1))
+
+    if observer is not None:
+        observer(net_list, gate_list, pad_list, remark=level)
+    profiler.count("mincut.regions", splits)
+    profiler.count("mincut.cut", total_cut)
+    return {"levels": level + 1, "regions": splits, "cut": total_cut}
+
+
+def main(headless=False):
+    import parser
+    from evaluations import summation_of_HPWL
+    from legalization import legalize_and_refine
+
+    net_list, gate_list, pad_list = parser.parser("benchmarks/struct")
+    print("initial HPWL:", summation_of_HPWL(net_list, gate_list, pad_list))
+    observer = None
+    if not headless:
+        import visualization
+        from frame_pipeline import FrameWriter
+        frames = FrameWriter("mincut_images/Animation.gif", fps=2, scale=0.5)
+        observer = visualization.renderer(path="mincut_images", frames=frames)
+    result = mincut_placement(net_list, gate_list, pad_list, observer=observer)
+    print("min-cut placement:", result["levels"], "levels,", result["regions"], "regions split, cut", result["cut"])
+    print("min-cut HPWL:", summation_of_HPWL(net_list, gate_list, pad_list))
+    result = legalize_and_refine(net_list, gate_list, pad_list)
+    print("legalized HPWL:", result["legal_HPWL"], "detailed placement HPWL:", result["detailed_HPWL"])
+    if not headless:
+        visualization.pygame_quit(frames=frames)
+
+
+if __name__ == "__main__":
+    main(headless="--headless" in sys.argv)
@@ -0,0 +1,141 @@
+import math
+import random
+
+import numpy as np
+
+from data_structures import netlist_of
+from evaluations import IncrementalHPWL
+from legalization import legalize
+
+
+class WindowedMoveGenerator:
+    # SA moves over the sites of a legalization.SlotGrid with whitespace * num_gates free sites: by default the gates
+    # are first legalized onto a new grid, or grid is a grid they already occupy (e.g. from legalize()). the default
+    # whitespace is that of legalize(), so legalize_and_refine after the anneal keeps every gate on its site.
+    # a move takes a random gate and a random site within the range window around it, and swaps the two gates, or
+    # displaces the gate when the site is free, so the placement stays a permutation of legal sites and
+    # grid.occupant follows it.
+    # the sites never move, so they are bucketed once into a uniform grid of cells of about slots_per_cell sites.
+    # the window follows the acceptance rate of the last temperature, window *= 1 - target_acceptance + rate
+    # (the range limiter of VPR), between min_window and the size of the region.
+    def __init__(self, gate_list, whitespace=0.2, window=None, min_window=None, target_acceptance=0.44,
+                 slots_per_cell=4, rng=random, grid=None):
+        self.gate_list = gate_list
+        self.netlist = netlist_of(gate_list)
+        self.rng = rng
+        self.target_acceptance = target_acceptance
+
+        num_gates = self.netlist.num_gates
+        self.slots_per_cell = slots_per_cell
+        if grid is None:
+            grid, displacement = legalize(gate_list, whitespace=whitespace)
+        elif np.count_nonzero(grid.occupant >= 0) != num_gates:
+            raise ValueError("the grid holds %d of the %d gates" % (np.count_nonzero(grid.occupant >= 0), num_gates))
+        self.grid = grid
+        self._index_slots(grid.slot_xy)
+        self.slot_gate = grid.occupant.tolist()
+        self.gate_slot = [0] * num_gates
+        for slot, gate in enumerate(self.slot_gate):
+            if gate >= 0:
+                self.gate_slot[gate] = slot
+                self.netlist.gate_xy[gate] = grid.slot_xy[slot]
+
+        self.max_window = self.extent
+        self.window = self.max_window if window is None else window
+        self.min_window = self.cell_size if min_window is None else min_window
+        self.proposed = 0
+        self.accepted = 0
+        self._pending = None
+
+    def _index_slots(self, slot_xy):
+        # static spatial index of the slots
+        self.slot_xy = slot_xy.tolist()
+        self.lower = slot_xy.min(axis=0).tolist()
+        self.extent = max(float(np.ptp(slot_xy, axis=0).max()), 1e-9)
+        self.bins = max(1, int(math.sqrt(len(slot_xy) / self.slots_per_cell)))
+        self.cell_size = self.extent / self.bins
+        cells = self._cell_of(slot_xy)
+        self.cell_slots = [[] for c in range(self.bins * self.bins)]
+        for slot, cell in enumerate(cells.tolist()):
+            self.cell_slots[cell].append(slot)
+
+    def get_state(self):
+        # everything a resumed anneal needs besides the gate coordinates, as arrays for a checkpoint
+        return {"slot_xy": np.array(self.slot_xy), "slot_gate": np.array(self.slot_gate, dtype=np.int64),
+                "window": np.float64(self.window)}
+
+    def set_state(self, state):
+        self._index_slots(np.asarray(state["slot_xy"], dtype=np.float64))
+        self.slot_gate = np.asarray(state["slot_gate"]).tolist()
+        self.gate_slot = [0] * len(self.gate_list)
+        for slot, gate in enumerate(self.slot_gate):
+            if gate >= 0:
+                self.gate_slot[gate] = slot
+        if len(self.slot_gate) == len(self.grid.occupant):
+            self.grid.occupant[:] = self.slot_gate
+        self.window = float(state["window"])
+        self.proposed = 0
+        self.accepted = 0
+
+    def _cell_of(self, xy):
+        cell_xy = np.clip(((xy - self.lower) / self.cell_size).astype(np.int64), 0, self.bins - 1)
+        return cell_xy[:, 0] * self.bins + cell_xy[:, 1]
+
+    def _random_slot_near(self, slot):
+        # a random slot in the cell of a random point of the window around slot, None when that cell is empty
+        x, y = self.slot_xy[slot]
+        cx = int((x + (2 * self.rng.random() - 1) * self.window - self.lower[0]) / self.cell_size)
+        cy = int((y + (2 * self.rng.random() - 1) * self.window - self.lower[1]) / self.cell_size)
+        cell = self.cell_slots[min(max(cx, 0), self.bins - 1) * self.bins + min(max(cy, 0), self.bins - 1)]
+        if not cell:
+            return None
+        return cell[self.rng.randint(0, len(cell) - 1)]
+
+    def propose(self, hpwl: IncrementalHPWL):
+        # proposes one move on hpwl and returns its delta HPWL; must be followed by accept() or reject()
+        i = self.rng.randint(0, len(self.gate_list) - 1)
+        source = self.gate_slot[i]
+        target = None
+        for attempt in range(4):
+            target = self._random_slot_near(source)
+            if target is not None and target != source:
+                break
+        if target is None or target == source:
+            target = source
+        self._pending = (i, source, target)
+        self.proposed += 1
+        j = self.slot_gate[target]
+        if target == source:
+            return hpwl.propose_move([], [])
+        if j < 0:
+            return hpwl.propose_move([self.gate_list[i]], [self.slot_xy[target]])
+        return hpwl.propose_swap(self.gate_list[i], self.gate_list[j])
+
+    def accept(self, hpwl: IncrementalHPWL):
+        hpwl.accept()
+        i, source, target = self._pending
+        j = self.slot_gate[target]
+        self.slot_gate[source] = j
+        self.slot_gate[target] = i
+        self.grid.occupant[source] = j
+        self.grid.occupant[target] = i
+        self.gate_slot[i] = target
+        if j >= 0:
+            self.gate_slot[j] = source
+        self.accepted += 1
+        self._pending = None
+
+    def reject(self, hpwl: IncrementalHPWL):
+        hpwl.reject()
+        self._pending = None
+
+    def acceptance_rate(self):
+        return self.accepted / max(self.proposed, 1)
+
+    def adapt(self):
+        # shrinks or widens the window from the acceptance rate since the last call, returns that rate
+        rate = self.acceptance_rate()
+        self.window = min(max(self.window * (1 - self.target_acceptance + rate), self.min_window), self.max_window)
+        self.proposed = 0
+        self.accepted = 0
+        return rate
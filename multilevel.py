@@ -0,0 +1,273 @@
+import math
+import random
+import sys
+import time
+
+import numpy as np
+from scipy.sparse import coo_matrix
+
+from data_structures import Netlist, netlist_of
+from evaluations import summation_of_HPWL
+from net_models import clique_gate_pairs
+import instrumentation
+
+# multilevel placement: the netlist is coarsened by first-choice clustering into a hierarchy of smaller netlists,
+# a placer runs on the coarsest one, and the placement is projected back level by level (the members of a cluster
+# start around its position) with a refinement run after every projection. the placers see a cluster as one gate.
+
+
+def affinity_matrix(netlist, max_net_size=16):
+    # symmetric gate affinities, every net with k gates (2 <= k <= max_net_size) adds 1 / (k - 1) to each of its
+    # gate pairs; larger nets carry little clustering information and would make the matrix dense
+    rows = []
+    cols = []
+    weights = []
+    gate_count = netlist.net_gate_count
+    for k in range(2, max_net_size + 1):
+        nets = np.nonzero(gate_count == k)[0]
+        if len(nets) == 0:
+            continue
+        i, j, w = clique_gate_pairs(netlist, nets, weight=1.0 / (k - 1))
+        rows += [i, j]
+        cols += [j, i]
+        weights += [w, w]
+    if not rows:
+        return coo_matrix((netlist.num_gates, netlist.num_gates)).tocsr()
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols)
+    weights = np.concatenate(weights)
+    # a gate listed twice on a net is no affinity to itself
+    distinct = rows != cols
+    return coo_matrix((weights[distinct], (rows[distinct], cols[distinct])),
+                      shape=(netlist.num_gates, netlist.num_gates)).tocsr()
+
+
+def first_choice_clusters(netlist, weight, reduction=0.5, max_net_size=16, rng=random):
+    # first-choice clustering: the gates are visited in random order and every gate not yet clustered joins the
+    # neighbour (clustered or not) of highest affinity / cluster weight, as long as the cluster stays below twice the
+    # mean cluster weight of the target, until the number of clusters reaches reduction * num_gates.
+    # weight[g] is the number of original gates in g. returns (cluster of every gate, number of clusters)
+    affinity = affinity_matrix(netlist, max_net_size)
+    ptr = affinity.indptr
+    neighbours = affinity.indices
+    affinities = affinity.data
+    num_gates = netlist.num_gates
+    target = max(1, int(reduction * num_gates))
+    max_weight = 2 * weight.sum() / target
+    weight = weight.tolist()
+
+    cluster = [-1] * num_gates
+    cluster_weight = []
+    num_clusters = num_gates
+    order = list(range(num_gates))
+    rng.shuffle(order)
+    for u in order:
+        if cluster[u] >= 0:
+            continue
+        best = -1
+        best_score = 0.0
+        if num_clusters > target:
+            for k in range(ptr[u], ptr[u + 1]):
+                v = int(neighbours[k])
+                joined = weight[u] + (cluster_weight[cluster[v]] if cluster[v] >= 0 else weight[v])
+                if joined > max_weight:
+                    continue
+                score = affinities[k] / joined
+                if score > best_score:
+                    best_score = score
+                    best = v
+        if best < 0:
+            cluster[u] = len(cluster_weight)
+            cluster_weight.append(weight[u])
+            continue
+        if cluster[best] < 0:
+            cluster[best] = len(cluster_weight)
+            cluster_weight.append(weight[best])
+        cluster[u] = cluster[best]
+        cluster_weight[cluster[u]] += weight[u]
+        num_clusters -= 1
+    return np.array(cluster, dtype=np.int64), len(cluster_weight)
+
+
+def coarse_netlist(netlist, cluster, num_clusters, weight):
+    # the clustered netlist, a cluster placed at the weighted mean of its gates. nets left with a single cluster
+    # and no pad are dropped, the pads and their nets are kept as they are
+    gates = np.repeat(np.arange(netlist.num_gates), np.diff(netlist.gate_net_ptr))
+    pairs = np.unique(cluster[gates] * netlist.num_nets + netlist.gate_net_idx)
+    clusters = pairs // netlist.num_nets
+    nets = pairs % netlist.num_nets
+    keep = (np.bincount(nets, minlength=netlist.num_nets) >= 2) | \
+        (np.bincount(netlist.pad_net, minlength=netlist.num_nets) >= 1)
+    net_index = np.cumsum(keep) - 1
+    kept = keep[nets]
+    clusters = clusters[kept]
+    nets = net_index[nets[kept]]
+
+    gate_net_ptr = np.zeros(num_clusters + 1, dtype=np.int64)
+    np.cumsum(np.bincount(clusters, minlength=num_clusters), out=gate_net_ptr[1:])
+    cluster_weight = np.bincount(cluster, weights=weight, minlength=num_clusters)
+    gate_xy = np.column_stack([np.bincount(cluster, weights=weight * netlist.gate_xy[:, d], minlength=num_clusters)
+                               for d in range(2)]) / cluster_weight[:, None]
+    coarse = Netlist(int(keep.sum()), gate_net_ptr, nets, net_index[netlist.pad_net], netlist.pad_xy, gate_xy=gate_xy)
+    return coarse, cluster_weight
+
+
+def project(coarse, netlist, cluster, lower=(0, 0), upper=(100, 100)):
+    # every gate takes the position of its cluster, the members of a cluster spread on a circle of half the gate
+    # pitch of the finer level so that they do not start on top of each other
+    size = np.bincount(cluster, minlength=coarse.num_gates)
+    order = np.argsort(cluster, kind="stable")
+    rank = np.empty(netlist.num_gates, dtype=np.int64)
+    rank[order] = np.arange(netlist.num_gates) - np.repeat(np.cumsum(size) - size, size)
+    extent = np.subtract(upper, lower)
+    radius = np.where(size[cluster] > 1, 0.5 * math.sqrt(extent[0] * extent[1] / netlist.num_gates), 0.0)
+    angle = 2 * np.pi * rank / size[cluster]
+    netlist.gate_xy[:] = coarse.gate_xy[cluster] + radius[:, None] * np.column_stack((np.cos(angle), np.sin(angle)))
+    np.clip(netlist.gate_xy, lower, upper, out=netlist.gate_xy)
+
+
+def place_SA(net_list, gate_list, pad_list, schedule=None, time_budget=None):
+    # the annealer only moves gates between slots, so it starts from a legal placement spread over the die
+    # (the clusters of random positions all sit near its center). without a schedule, time_budget (seconds)
+    # gives a lam schedule over that budget
+    from SA import simulated_annealing
+    from annealing_schedule import AnnealingSchedule
+    from legalization import legalize
+    from move_generator import WindowedMoveGenerator
+    from trace_recorder import TraceRecorder
+    if schedule is None and time_budget is not None:
+        schedule = AnnealingSchedule(cooling="lam", time_budget=time_budget)
+    grid, displacement = legalize(gate_list, spread=True)
+    simulated_annealing(net_list, gate_list, pad_list, moves=WindowedMoveGenerator(gate_list, grid=grid),
+                        schedule=schedule, trace=TraceRecorder(capacity=1024, ring=True))
+
+
+def refine_SA(net_list, gate_list, pad_list, pitches=3, initial_acceptance=0.1, temperatures=6, time_budget=None):
+    # short low temperature anneal with moves within a few gate pitches, from the projection legalized onto the
+    # slots of the finer level, stopped after time_budget seconds
+    from SA import simulated_annealing
+    from annealing_schedule import AnnealingSchedule
+    from legalization import legalize
+    from move_generator import WindowedMoveGenerator
+    from trace_recorder import TraceRecorder
+    grid, displacement = legalize(gate_list)
+    pitch = 100 / math.sqrt(len(gate_list))
+    schedule = AnnealingSchedule(initial_acceptance=initial_acceptance, alpha=0.7, max_temperatures=temperatures,
+                                 time_budget=time_budget)
+    moves = WindowedMoveGenerator(gate_list, window=pitches * pitch, grid=grid)
+    simulated_annealing(net_list, gate_list, pad_list, moves=moves, schedule=schedule,
+                        trace=TraceRecorder(capacity=1024, ring=True))
+
+
+def place_FD(net_list, gate_list, pad_list):
+    from forced_direct import forced_directed_placement_with_repulsive_force
+    forced_directed_placement_with_repulsive_force(net_list, gate_list, pad_list)
+
+
+def refine_FD(net_list, gate_list, pad_list, iterations=10):
+    from forced_direct import forced_directed_placement_with_repulsive_force
+    forced_directed_placement_with_repulsive_force(net_list, gate_list, pad_list, max_iterations=iterations,
+                                                   unit_time=0.1)
+
+
+def place_quadratic(net_list, gate_list, pad_list):
+    from Quadratic import solve
+    solve(net_list, gate_list, pad_list)
+
+
+# name -> (place, refine). the quadratic optimum does not depend on the start, so its levels are only projected
+PLACERS = {"SA": (place_SA, refine_SA), "FD": (place_FD, refine_FD), "quadratic": (place_quadratic, None)}
+
+
+def time_share(deadline, shares):
+    # an equal share of the seconds left until deadline, as the keyword arguments of a placer
+    if deadline is None:
+        return {}
+    return {"time_budget": max(deadline - time.monotonic(), 0.0) / shares}
+
+
+def multilevel_placement(net_list, gate_list, pad_list, place="FD", refine=None, min_gates=200, reduction=0.5,
+                         max_levels=10, max_net_size=16, rng=random, observer=None, time_budget=None):
+    # place is a name in PLACERS or a placer place(net_list, gate_list, pad_list) for the coarsest netlist, refine
+    # a placer for every finer level (by default the refinement of the named placer, none for a callable place).
+    # coarsening stops at min_gates clusters, after max_levels levels or when a level removes less than 10% of
+    # the gates. observer(net_list, gate_list, pad_list, remark=level) is called after every level.
+    # time_budget (seconds, including the coarsening) is passed on as a time_budget keyword, so the placers must
+    # take one (the SA placers): the coarsest placement gets half of it, every refinement a share of what is left.
+    # returns {"gates": gates per level, finest first, "HPWL": HPWL after every level, coarsest first}
+    if not callable(place):
+        place, default_refine = PLACERS[place]
+        if refine is None:
+            refine = default_refine
+    profiler = instrumentation.get_profiler()
+    deadline = None if time_budget is None else time.monotonic() + time_budget
+
+    # coarsening
+    netlist = netlist_of(gate_list)
+    levels = [(netlist, None)]
+    weight = np.ones(netlist.num_gates, dtype=np.float64)
+    with profiler.timer("multilevel.coarsen"):
+        while netlist.num_gates > min_gates and len(levels) <= max_levels:
+            cluster, num_clusters = first_choice_clusters(netlist, weight, reduction, max_net_size, rng)
+            if num_clusters > 0.9 * netlist.num_gates:
+                break
+            netlist, weight = coarse_netlist(netlist, cluster, num_clusters, weight)
+            levels[-1] = (levels[-1][0], cluster)
+            levels.append((netlist, None))
+
+    # placement of the coarsest level
+    HPWL = []
+    coarse = levels[-1][0]
+    lists = coarse.make_lists() if coarse is not levels[0][0] else (net_list, gate_list, pad_list)
+    with profiler.timer("multilevel.place"):
+        place(*lists, **time_share(deadline, 2 if len(levels) > 1 and refine is not None else 1))
+    HPWL.append(summation_of_HPWL(*lists))
+    profiler.record("multilevel", level=len(levels) - 1, gates=coarse.num_gates, HPWL=HPWL[-1])
+    if observer is not None:
+        observer(*lists, remark=len(levels) - 1)
+
+    # uncoarsening with refinement
+    for level in range(len(levels) - 2, -1, -1):
+        fine, cluster = levels[level]
+        project(coarse, fine, cluster)
+        lists = fine.make_lists() if level > 0 else (net_list, gate_list, pad_list)
+        if refine is not None:
+            with profiler.timer("multilevel.refine"):
+                refine(*lists, **time_share(deadline, level + 1))
+        HPWL.append(summation_of_HPWL(*lists))
+        profiler.record("multilevel", level=level, gates=fine.num_gates, HPWL=HPWL[-1])
+        if observer is not None:
+            observer(*lists, remark=level)
+        coarse = fine
+    profiler.count("multilevel.levels", len(levels))
+    return {"gates": [level.num_gates for level, cluster in levels], "HPWL": HPWL}
+
+
+def main(headless=False, placer="FD"):
+    import parser
+    from legalization import legalize_and_refine
+
+    net_list, gate_list, pad_list = parser.parser("benchmarks/struct")
+    print("initial HPWL:", summation_of_HPWL(net_list, gate_list, pad_list))
+    observer = None
+    if not headless:
+        import visualization
+        from frame_pipeline import FrameWriter
+        frames = FrameWriter("multilevel_images/Animation.gif", fps=2, scale=0.5)
+        observer = visualization.renderer(path="multilevel_images", frames=frames)
+    result = multilevel_placement(net_list, gate_list, pad_list, place=placer, observer=observer)
+    print("levels:", " -> ".join(str(gates) for gates in result["gates"]), "gates, HPWL per level:", result["HPWL"])
+    print("multilevel HPWL:", summation_of_HPWL(net_list, gate_list, pad_list))
+    result = legalize_and_refine(net_list, gate_list, pad_list, spread=placer == "quadratic")
+    print("legalized HPWL:", result["legal_HPWL"], "detailed placement HPWL:", result["detailed_HPWL"])
+    if not headless:
+        visualization.pygame_quit(frames=frames)
+
+
+if __name__ == "__main__":
+    # python multilevel.py [--headless] [--placer=SA|FD|quadratic]
+    placer = "FD"
+    for argument in sys.argv[1:]:
+        if argument.startswith("--placer="):
+            placer = argument.split("=", 1)[1]
+    main(headless="--headless" in sys.argv, placer=placer)
@@ -0,0 +1,150 @@
+import numpy as np
+
+# a net model turns every net into two-pin connections of the quadratic objective:
+#   gate_pairs  (i, j, w): variables i and j pulled together with weight w
+#   pad_anchors (i, p, w): variable i pulled towards the fixed pad p with weight w
+# the variables are the gates (0 .. num_gates - 1) followed by one auxiliary star node per star net.
+
+
+def segment_members(ptr_starts, counts):
+    # expands the segments [ptr_starts[s], ptr_starts[s] + counts[s]) into (segment, position) pairs
+    counts = np.asarray(counts, dtype=np.int64)
+    owners = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.arange(len(owners)) - np.repeat(np.cumsum(counts) - counts, counts)
+    positions = np.repeat(np.asarray(ptr_starts, dtype=np.int64), counts) + offsets
+    return owners, positions
+
+
+def empty_connections():
+    return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+
+
+def concatenate_connections(connections):
+    return tuple(np.concatenate(parts) for parts in zip(empty_connections(), *connections))
+
+
+def clique_gate_pairs(netlist, nets=None, weight=1.0):
+    # (i, j, w) for every unordered pair of gates i < j sharing a net; a pair sharing several nets appears several times
+    rows = [np.zeros(0, dtype=np.int64)]
+    cols = [np.zeros(0, dtype=np.int64)]
+    gate_count = netlist.net_gate_count
+    starts = netlist.net_pin_ptr[:-1]
+    if nets is None:
+        nets = np.arange(netlist.num_nets)
+    for k in np.unique(gate_count[nets][gate_count[nets] >= 2]):
+        nets_k = nets[gate_count[nets] == k]
+        members = netlist.net_pin_idx[starts[nets_k][:, None] + np.arange(k)]
+        j, l = np.triu_indices(k, 1)
+        rows.append(members[:, j].ravel())
+        cols.append(members[:, l].ravel())
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols)
+    return rows, cols, np.full(len(rows), weight, dtype=np.float64)
+
+
+def pad_anchor_pairs(netlist, nets=None, weight=1.0):
+    # (gate, pad, w) for every gate on the net of every pad
+    pads = np.arange(netlist.num_pads)
+    if nets is not None:
+        pads = pads[np.isin(netlist.pad_net, nets)]
+    pad_net = netlist.pad_net[pads]
+    owners, positions = segment_members(netlist.net_pin_ptr[pad_net], netlist.net_gate_count[pad_net])
+    gates = netlist.net_pin_idx[positions]
+    return gates, pads[owners], np.full(len(gates), weight, dtype=np.float64)
+
+
+def star_connections(netlist, nets, first_variable):
+    # every pin of a net with k pins is tied to the net's star node with weight k, which gives exactly the
+    # optimum of the clique model with weight 1 while needing k instead of k(k-1)/2 connections
+    nets = np.asarray(nets, dtype=np.int64)
+    pin_count = np.diff(netlist.net_pin_ptr)[nets]
+    owners, positions = segment_members(netlist.net_pin_ptr[nets], pin_count)
+    pins = netlist.net_pin_idx[positions]
+    stars = first_variable + owners
+    weights = pin_count[owners].astype(np.float64)
+    is_gate = pins < netlist.num_gates
+    gate_pairs = (pins[is_gate], stars[is_gate], weights[is_gate])
+    pad_anchors = (stars[~is_gate], pins[~is_gate] - netlist.num_gates, weights[~is_gate])
+    return gate_pairs, pad_anchors
+
+
+def net_model_connections(netlist, model="clique", fanout_threshold=4):
+    # model is "clique", "star" (star node for every net of three or more pins) or "hybrid" (clique up to
+    # fanout_threshold pins, star above). returns the nets owning a star node, gate_pairs and pad_anchors
+    if model == "clique":
+        fanout_threshold = np.inf
+    elif model == "star":
+        fanout_threshold = 2
+    elif model != "hybrid":
+        raise ValueError("unknown net model: " + str(model))
+    pin_count = np.diff(netlist.net_pin_ptr)
+    star_nets = np.nonzero((pin_count > fanout_threshold) & (netlist.net_gate_count > 0))[0]
+    clique_nets = np.nonzero(~np.isin(np.arange(netlist.num_nets), star_nets))[0]
+
+    star_pairs, star_anchors = star_connections(netlist, star_nets, netlist.num_gates)
+    gate_pairs = concatenate_connections([clique_gate_pairs(netlist, clique_nets), star_pairs])
+    pad_anchors = concatenate_connections([pad_anchor_pairs(netlist, clique_nets), star_anchors])
+    return star_nets, gate_pairs, pad_anchors
+
+
+def star_positions(netlist, star_nets, xy=None):
+    # centroid of the pins of every star net, used as the warm start of the star nodes
+    if xy is None:
+        xy = netlist.xy
+    if len(star_nets) == 0:
+        return np.zeros((0, 2), dtype=np.float64)
+    pin_count = np.diff(netlist.net_pin_ptr)[star_nets]
+    owners, positions = segment_members(netlist.net_pin_ptr[star_nets], pin_count)
+    pin_xy = xy[netlist.net_pin_idx[positions]]
+    sums = np.column_stack((np.bincount(owners, pin_xy[:, 0], len(star_nets)),
+                            np.bincount(owners, pin_xy[:, 1], len(star_nets))))
+    return sums / pin_count[:, None]
+
+
+def bound2bound_connections(netlist, xy=None, min_distance=0.1):
+    # Bound2Bound model: in each dimension the two boundary pins of a net are connected to each other and to every
+    # inner pin with weight 2 / ((k - 1) * distance), so the quadratic objective equals the HPWL at the placement xy.
+    # returns (gate_pairs, pad_anchors) for x and (gate_pairs, pad_anchors) for y
+    if xy is None:
+        xy = netlist.xy
+    pins = netlist.net_pin_idx
+    pin_count = np.diff(netlist.net_pin_ptr)
+    pin_nets = np.repeat(np.arange(netlist.num_nets), pin_count)
+    ends = netlist.net_pin_ptr[1:][pin_nets] - 1
+    starts = netlist.net_pin_ptr[:-1][pin_nets]
+    position = np.arange(len(pins))
+
+    connections = []
+    for d in range(2):
+        # pins sorted by coordinate inside every net, the segments stay where they are
+        order = np.lexsort((xy[pins, d], pin_nets))
+        sorted_pins = pins[order]
+        lower = sorted_pins[starts]
+        upper = sorted_pins[ends]
+        inner = (position != starts) & (position != ends)
+        first = position == starts
+        multi_pin = pin_count[pin_nets] >= 2
+
+        u = np.concatenate((sorted_pins[inner], sorted_pins[inner], lower[first & multi_pin]))
+        v = np.concatenate((lower[inner], upper[inner], upper[first & multi_pin]))
+        k = np.concatenate((pin_count[pin_nets][inner], pin_count[pin_nets][inner],
+                            pin_count[pin_nets][first & multi_pin]))
+        distance = np.maximum(np.abs(xy[u, d] - xy[v, d]), min_distance)
+        w = 2 / ((k - 1) * distance)
+        connections.append(_split_pin_connections(netlist, u, v, w))
+    return connections[0], connections[1]
+
+
+def _split_pin_connections(netlist, u, v, w):
+    # pin to pin connections become gate pairs or pad anchors; pad to pad connections are constant and dropped
+    n = netlist.num_gates
+    u_gate = u < n
+    v_gate = v < n
+    both = u_gate & v_gate
+    gate_pairs = (u[both], v[both], w[both])
+    u_only = u_gate & ~v_gate
+    v_only = v_gate & ~u_gate
+    pad_anchors = (np.concatenate((u[u_only], v[v_only])),
+                   np.concatenate((v[u_only], u[v_only])) - n,
+                   np.concatenate((w[u_only], w[v_only])))
+    return gate_pairs, pad_anchors
@@ -0,0 +1,60 @@
+import json
+import os
+import sys
+
+import numpy as np
+
+from data_structures import Netlist
+from parser import parse_netlist
+
+# on-disk netlist for many placement workers on one node: a directory of fixed-width .npy arrays that every worker
+# maps read-only, so the connectivity is shared through the page cache and only the coordinates are private.
+#   meta.json                                     num_gates, num_nets, num_pads, version
+#   gate_net_ptr, gate_net_idx                    int64, gate -> net CSR
+#   net_pin_ptr, net_pin_idx, net_gate_count      int64, net -> pin CSR
+#   pad_net, connected_cell_number                int64
+#   pad_xy                                        float64 (num_pads, 2)
+
+STORE_VERSION = 1
+INDEX_ARRAYS = ("gate_net_ptr", "gate_net_idx", "net_pin_ptr", "net_pin_idx", "net_gate_count", "pad_net",
+                "connected_cell_number")
+
+
+def write_store(netlist, path):
+    os.makedirs(path, exist_ok=True)
+    for name in INDEX_ARRAYS:
+        np.save(os.path.join(path, name + ".npy"), np.ascontiguousarray(getattr(netlist, name), dtype=np.int64))
+    np.save(os.path.join(path, "pad_xy.npy"), np.ascontiguousarray(netlist.pad_xy, dtype=np.float64))
+    # meta.json is written last, a store without it is incomplete
+    meta = {"version": STORE_VERSION, "num_gates": netlist.num_gates, "num_nets": netlist.num_nets,
+            "num_pads": netlist.num_pads}
+    with open(os.path.join(path, "meta.json"), "w") as file:
+        json.dump(meta, file)
+
+
+def open_store(path, gate_xy=None):
+    # the index arrays are read-only memory maps, the gate and pad coordinates are private copies.
+    # gate_xy is None for a random initial placement as with the parser
+    with open(os.path.join(path, "meta.json")) as file:
+        meta = json.load(file)
+    if meta["version"] != STORE_VERSION:
+        raise ValueError("%s: netlist store version %s, expected %d" % (path, meta["version"], STORE_VERSION))
+    arrays = {}
+    for name in INDEX_ARRAYS:
+        arrays[name] = np.load(os.path.join(path, name + ".npy"), mmap_mode="r")
+    pad_xy = np.load(os.path.join(path, "pad_xy.npy"), mmap_mode="r")
+    return Netlist(meta["num_nets"], arrays["gate_net_ptr"], arrays["gate_net_idx"], arrays["pad_net"], pad_xy,
+                   gate_xy=gate_xy, derived=arrays)
+
+
+def build_store(filename, path):
+    write_store(parse_netlist(filename), path)
+
+
+def main():
+    # python netlist_store.py benchmarks/biomed stores/biomed
+    build_store(sys.argv[1], sys.argv[2])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,77 +1,120 @@
+import hashlib
+import os
+
 from data_structures import *
+import instrumentation
+
+CACHE_VERSION = 1
+
+
+def parse_netlist(filename, cache=True, cache_dir=None):
+    # the parsed arrays are cached as .npz keyed by the hash of the file content, in cache_dir
+    # (default: .netlist_cache next to the benchmark), so that a benchmark is tokenized only once
+    with instrumentation.get_profiler().timer("parse"):
+        return _parse_netlist(filename, cache, cache_dir)
+
+
+def _parse_netlist(filename, cache, cache_dir):
+    with open(filename, "rb") as file:
+        data = file.read()
+
+    cache_path = None
+    if cache:
+        cache_path = netlist_cache_path(filename, data, cache_dir)
+        if os.path.exists(cache_path):
+            instrumentation.get_profiler().count("parse.cache_hits")
+            return load_netlist_cache(cache_path)
+
+    netlist = parse_netlist_data(data, filename)
+
+    if cache_path is not None:
+        try:
+            save_netlist_cache(netlist, cache_path)
+        except OSError:
+            # a read-only benchmark directory only costs the cache
+            pass
+    return netlist
+
 
+def parse_netlist_data(data, filename=""):
+    # the whole file is tokenized in one pass, then the sections are cut out of the token array:
+    #   gate_number net_number
+    #   gate_id connectivity net_1 ... net_connectivity      (gate_number lines)
+    #   pad_number
+    #   pad_id net x y                                       (pad_number lines)
+    try:
+        tokens = np.array(data.split(), dtype=np.float64)
+    except ValueError as error:
+        raise ValueError("%s: non numeric token (%s)" % (filename, error))
+    if len(tokens) < 2:
+        raise ValueError("%s: missing gate and net numbers" % filename)
+    gate_number = int(tokens[0])
+    net_number = int(tokens[1])
 
-def parser(filename):
-    # parse the txt file
-    file = open(filename)
-    lines = file.readlines()
-    file.close()
-    file_info = []
-    for line in lines:
-        line = line.strip()
-        line = line.split()
-        for i in range(len(line)):
-            line[i] = float(line[i])
-
-        file_info.append(line)
-    del line, lines, file
-
-    # parse the info of gates and nets
-    gate_number = int(file_info[0][0])
-    net_number = int(file_info[0][1])
-    gate_list = []
-    file_info.pop(0)
-
-    for i in range(gate_number):
-        gate_info = file_info.pop(0)
-        temp_gate = Gate(gate_info[0], gate_info[1])
-        for j in range(int(temp_gate.connectivity)):
-            temp_gate.connected_nets.append(gate_info.pop(2))
-        temp_gate.reformat_data_type()
-        gate_list.append(temp_gate)
-    del gate_info, i, j, temp_gate
+    # parse the info of gates and nets, only the start of every gate record needs a sequential walk
+    gate_start = np.empty(gate_number, dtype=np.int64)
+    position = 2
+    values = tokens.tolist()
+    try:
+        for i in range(gate_number):
+            gate_start[i] = position
+            position += 2 + int(values[position + 1])
+    except IndexError:
+        raise ValueError("%s: file ends inside the gate records" % filename)
+    if position > len(tokens):
+        # the nets of the last gate run past the end
+        raise ValueError("%s: file ends inside the gate records" % filename)
+    if np.any(tokens[gate_start] != np.arange(1, gate_number + 1)):
+        raise ValueError("%s: gate IDs are not 1 .. %d in order" % (filename, gate_number))
+    connectivity = tokens[gate_start + 1].astype(np.int64)
+    gate_net_ptr = np.zeros(gate_number + 1, dtype=np.int64)
+    np.cumsum(connectivity, out=gate_net_ptr[1:])
+    net_positions = np.repeat(gate_start + 2 - gate_net_ptr[:-1], connectivity) + np.arange(gate_net_ptr[-1])
+    gate_net_idx = tokens[net_positions].astype(np.int64) - 1
 
     # parse the pad info
-    pad_number = int(file_info.pop(0)[0])
-    pad_list = []
-    for i in range(pad_number):
-        pad_info = file_info.pop(0)
-        temp_pad = Pad(pad_info[0], pad_info[1], pad_info[2], pad_info[3])
-        temp_pad.reformat_data_type()
-        pad_list.append(temp_pad)
-    del i, temp_pad, pad_info, file_info
-
-    # generate the net list
-    net_list = []  # None is for the equality of index and net ID
-    for i in range(net_number):
-        net_list.append(Net(i + 1))
-    for i in range(gate_number):
-        temp_gate = gate_list[i]
-        temp_connection_list = temp_gate.connected_nets
-        for j in range(temp_gate.connectivity):
-            net_list[temp_connection_list[j] - 1].connected_gates.append(temp_gate.id)
-    del temp_gate, temp_connection_list, i, j
-    for i in range(pad_number):
-        temp_pad = pad_list[i]
-        connected_net = temp_pad.connected_net
-        net_list[connected_net - 1].connected_pad.append(temp_pad.pad_number)
-    del temp_pad, connected_net, i
-
-    for i in range(len(net_list)):
-        net_list[i].reformat_data_type()
-
-    # get the connected_cell_number
-    for i in range(len(gate_list)):
-        gate_i = gate_list[i]
-        connected_nets = gate_i.connected_nets
-        for j in range(len(connected_nets)):
-            net_i = net_list[connected_nets[j]-1]
-            gate_i.connected_cell_number += len(net_i.connected_gates)
-            gate_i.connected_cell_number += len(net_i.connected_pad)
-
-
-    # for equality with indexing and ID
-    # net_list.insert(0, None)
-    # gate_list.insert(0, None)
-    # pad_list.insert(0, None)
-    return net_list, gate_list, pad_list
+    if position >= len(tokens):
+        raise ValueError("%s: missing pad number" % filename)
+    pad_number = int(tokens[position])
+    pad_info = tokens[position + 1:]
+    if len(pad_info) != 4 * pad_number:
+        raise ValueError("%s: expected %d pad records, found %d values" % (filename, pad_number, len(pad_info)))
+    pad_info = pad_info.reshape(pad_number, 4)
+    if np.any(pad_info[:, 0] != np.arange(1, pad_number + 1)):
+        raise ValueError("%s: pad IDs are not 1 .. %d in order" % (filename, pad_number))
+    pad_net = pad_info[:, 1].astype(np.int64) - 1
+    pad_xy = pad_info[:, 2:]
+
+    for net_idx in (gate_net_idx, pad_net):
+        if len(net_idx) and (net_idx.min() < 0 or net_idx.max() >= net_number):
+            raise ValueError("%s: net IDs outside 1 .. %d" % (filename, net_number))
+
+    # the net list and the connected_cell_number are derived from the incidence arrays
+    return Netlist(net_number, gate_net_ptr, gate_net_idx, pad_net, pad_xy)
+
+
+def netlist_cache_path(filename, data, cache_dir=None):
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(filename)), ".netlist_cache")
+    digest = hashlib.sha1(data).hexdigest()
+    return os.path.join(cache_dir, "%s.v%d.%s.npz" % (os.path.basename(filename), CACHE_VERSION, digest[:16]))
+
+
+def save_netlist_cache(netlist, cache_path):
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    temp_path = cache_path + ".%d.tmp" % os.getpid()
+    with open(temp_path, "wb") as file:
+        np.savez(file, num_nets=netlist.num_nets, gate_net_ptr=netlist.gate_net_ptr,
+                 gate_net_idx=netlist.gate_net_idx, pad_net=netlist.pad_net, pad_xy=netlist.pad_xy)
+    os.replace(temp_path, cache_path)
+
+
+def load_netlist_cache(cache_path):
+    with np.load(cache_path) as arrays:
+        return Netlist(int(arrays["num_nets"]), arrays["gate_net_ptr"], arrays["gate_net_idx"], arrays["pad_net"],
+                       arrays["pad_xy"])
+
+
+def parser(filename, cache=True):
+    netlist = parse_netlist(filename, cache=cache)
+    return netlist.make_lists()
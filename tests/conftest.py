@@ -0,0 +1,36 @@
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from data_structures import Netlist
+
+
+def random_netlist(num_gates=60, num_nets=80, num_pads=12, max_net_gates=4, seed=0, pad_net=None):
+    # connected random netlist: every gate is on at least one net, every pad on a net (pad_net, or random nets)
+    rng = random.Random(seed)
+    random.seed(seed)
+    gate_nets = [[] for g in range(num_gates)]
+    for n in range(num_nets):
+        for g in rng.sample(range(num_gates), rng.randint(2, max_net_gates)):
+            gate_nets[g].append(n)
+    for g in range(num_gates):
+        if not gate_nets[g]:
+            gate_nets[g].append(rng.randrange(num_nets))
+        gate_nets[g] = sorted(set(gate_nets[g]))
+    gate_net_ptr = np.cumsum([0] + [len(nets) for nets in gate_nets])
+    gate_net_idx = np.array([n for nets in gate_nets for n in nets], dtype=np.int64)
+    if pad_net is None:
+        pad_net = [rng.randrange(num_nets) for p in range(num_pads)]
+    num_pads = len(pad_net)
+    pad_xy = [(rng.choice((0, 100)), rng.uniform(0, 100)) for p in range(num_pads)]
+    return Netlist(num_nets, gate_net_ptr, gate_net_idx, pad_net, pad_xy).make_lists()
+
+
+@pytest.fixture
+def lists():
+    return random_netlist()
@@ -0,0 +1,32 @@
+import io
+import contextlib
+import time
+
+from annealing_schedule import AnnealingSchedule
+from SA import simulated_annealing
+from trace_recorder import TraceRecorder
+
+from conftest import random_netlist
+
+
+def test_lam_does_not_freeze_on_a_plateau():
+    schedule = AnnealingSchedule(cooling="lam", time_budget=100.0)
+    schedule.start()
+    assert not schedule.frozen([100.0] * 50)
+    geometric = AnnealingSchedule()
+    geometric.start()
+    assert geometric.frozen([100.0] * 50)
+
+
+def test_lam_run_uses_its_time_budget():
+    # a short patience, so that a patience rule would stop the run on the first plateau
+    net_list, gate_list, pad_list = random_netlist(num_gates=300, num_nets=400, num_pads=20)
+    time_budget = 3.0
+    schedule = AnnealingSchedule(cooling="lam", time_budget=time_budget, patience=2)
+    start = time.monotonic()
+    with contextlib.redirect_stdout(io.StringIO()):
+        simulated_annealing(net_list, gate_list, pad_list, schedule=schedule,
+                            trace=TraceRecorder(capacity=64, ring=True))
+    elapsed = time.monotonic() - start
+    assert elapsed >= 0.9 * time_budget
+    assert elapsed < 2 * time_budget
@@ -0,0 +1,23 @@
+import pytest
+
+from evaluations import IncrementalHPWL, summation_of_HPWL
+
+
+def test_propose_move_matches_full_evaluation(lists):
+    net_list, gate_list, pad_list = lists
+    hpwl = IncrementalHPWL(net_list, gate_list, pad_list)
+    hpwl.propose_move([gate_list[0], gate_list[5]], [(10.0, 20.0), (90.0, 5.0)])
+    hpwl.accept()
+    assert hpwl.total == pytest.approx(summation_of_HPWL(net_list, gate_list, pad_list))
+
+
+def test_propose_move_rejects_duplicate_gates(lists):
+    net_list, gate_list, pad_list = lists
+    hpwl = IncrementalHPWL(net_list, gate_list, pad_list)
+    total = hpwl.total
+    xy = gate_list[3].netlist.gate_xy.copy()
+    with pytest.raises(ValueError):
+        hpwl.propose_move([gate_list[3], gate_list[3]], [(10.0, 10.0), (20.0, 20.0)])
+    assert (gate_list[3].netlist.gate_xy == xy).all()
+    assert hpwl.total == total
+    assert hpwl.total == pytest.approx(summation_of_HPWL(net_list, gate_list, pad_list))
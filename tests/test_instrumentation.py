@@ -0,0 +1,33 @@
+import json
+
+import pytest
+
+import instrumentation
+from conftest import random_netlist
+from forced_direct import forced_directed_placement_with_repulsive_force
+from mincut import mincut_placement
+from multilevel import multilevel_placement
+
+
+def test_disabled_profiler_has_an_empty_summary(tmp_path):
+    profiler = instrumentation.disable()
+    assert not profiler.enabled
+    assert profiler.summary() == {"elapsed": 0.0, "timers": {}, "counters": {}}
+    profiler.export(str(tmp_path / "profile.json"))
+    with open(str(tmp_path / "profile.json")) as file:
+        assert json.load(file) == {"elapsed": 0.0, "timers": {}, "counters": {}, "series": {}}
+
+
+def test_placers_report_into_the_profiler_without_printing(capsys):
+    profiler = instrumentation.enable()
+    try:
+        result = forced_directed_placement_with_repulsive_force(*random_netlist(), max_iterations=5)
+        assert profiler.counters["FD.iterations"] == result["iterations"]
+        assert profiler.counters.get("FD.converged", 0) + profiler.counters.get("FD.not_converged", 0) == 1
+        result = mincut_placement(*random_netlist())
+        assert profiler.counters["mincut.cut"] == result["cut"]
+        result = multilevel_placement(*random_netlist(num_gates=400, num_nets=500), min_gates=100)
+        assert [row["gates"] for row in profiler.series["multilevel"]] == result["gates"][::-1]
+    finally:
+        instrumentation.disable()
+    assert capsys.readouterr().out == ""
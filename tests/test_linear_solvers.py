@@ -0,0 +1,51 @@
+import warnings
+
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
+import instrumentation
+from linear_solvers import conjugate_gradient, solve_placement, ssor_preconditioner
+
+
+def laplacian_with_isolated_variable():
+    # a path of 4 anchored variables and a fifth one on no net: zero row and column
+    A = np.zeros((5, 5))
+    for i in range(3):
+        A[i, i] += 1
+        A[i + 1, i + 1] += 1
+        A[i, i + 1] = A[i + 1, i] = -1
+    A[0, 0] += 1
+    A[3, 3] += 1
+    return csr_matrix(A)
+
+
+def test_ssor_preconditioner_with_zero_diagonal():
+    A = laplacian_with_isolated_variable()
+    M = ssor_preconditioner(A)
+    assert np.isfinite(M.matvec(np.ones(5))).all()
+
+
+def test_ssor_solve_with_zero_diagonal():
+    A = laplacian_with_isolated_variable()
+    b = np.zeros((5, 2))
+    b[0] = 10.0
+    b[3] = 30.0
+    xy = solve_placement(A, b, method="cg", preconditioner="ssor")
+    assert np.allclose(A @ xy, b, atol=1e-4)
+
+
+def test_conjugate_gradient_warns_when_not_converged():
+    n = 200
+    A = csr_matrix(np.diag(np.arange(1, n + 1, dtype=np.float64)))
+    profiler = instrumentation.enable()
+    try:
+        with pytest.warns(RuntimeWarning):
+            conjugate_gradient(A, np.ones(n), tol=1e-12, max_iterations=2)
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            conjugate_gradient(A, np.ones(n), tol=1e-8, max_iterations=1000)
+    finally:
+        instrumentation.disable()
+    assert profiler.counters["CG.not_converged"] == 1
+    assert profiler.counters["CG.solves"] == 2
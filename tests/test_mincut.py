@@ -0,0 +1,54 @@
+import random
+
+import pytest
+
+from mincut import fm_bipartition
+
+
+def cut_of(net_cells, fixed, side):
+    # nets with a pin, cell or fixed terminal, on both sides
+    cut = 0
+    for n, cells in enumerate(net_cells):
+        count = list(fixed[n])
+        for c in cells:
+            count[side[c]] += 1
+        cut += count[0] > 0 and count[1] > 0
+    return cut
+
+
+def random_hypergraph(num_cells, num_nets, seed):
+    rng = random.Random(seed)
+    net_cells = [sorted(rng.sample(range(num_cells), rng.randint(2, 5))) for n in range(num_nets)]
+    cell_nets = [[] for c in range(num_cells)]
+    for n, cells in enumerate(net_cells):
+        for c in cells:
+            cell_nets[c].append(n)
+    fixed = [[int(rng.random() < 0.1), int(rng.random() < 0.1)] for n in range(num_nets)]
+    side = [c % 2 for c in range(num_cells)]
+    rng.shuffle(side)
+    return cell_nets, net_cells, fixed, side
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("slack", [1, 5])
+def test_fm_keeps_the_balance_and_reports_its_cut(seed, slack):
+    cell_nets, net_cells, fixed, side = random_hypergraph(60, 90, seed)
+    initial_cut = cut_of(net_cells, fixed, side)
+    min_size = [30 - slack, 30 - slack]
+    max_size = [30 + slack, 30 + slack]
+    cut = fm_bipartition(cell_nets, net_cells, fixed, side, min_size, max_size)
+    assert cut == cut_of(net_cells, fixed, side)
+    assert cut <= initial_cut
+    for s in range(2):
+        assert min_size[s] <= side.count(s) <= max_size[s]
+
+
+def test_fm_separates_two_clusters():
+    # two cliques of four cells joined by one net, started fully mixed
+    net_cells = [[a, b] for group in ([0, 1, 2, 3], [4, 5, 6, 7]) for a in group for b in group if a < b] + [[3, 4]]
+    cell_nets = [[n for n, cells in enumerate(net_cells) if c in cells] for c in range(8)]
+    fixed = [[0, 0] for n in net_cells]
+    side = [0, 1, 0, 1, 0, 1, 0, 1]
+    cut = fm_bipartition(cell_nets, net_cells, fixed, side, [3, 3], [5, 5])
+    assert cut == 1
+    assert len(set(side[:4])) == 1 and len(set(side[4:])) == 1
@@ -0,0 +1,59 @@
+import random
+
+import numpy as np
+import pytest
+
+from conftest import random_netlist
+from evaluations import IncrementalHPWL, summation_of_HPWL
+from legalization import legalize, legalize_and_refine
+from move_generator import WindowedMoveGenerator
+
+
+def assert_legal(moves, gate_list):
+    gate_xy = gate_list[0].netlist.gate_xy
+    grid = moves.grid
+    occupied = np.nonzero(grid.occupant >= 0)[0]
+    # every gate on its own site of the grid, and the grid knows it
+    assert len(occupied) == len(gate_list)
+    assert sorted(grid.occupant[occupied].tolist()) == list(range(len(gate_list)))
+    assert np.array_equal(gate_xy[grid.occupant[occupied]], grid.slot_xy[occupied])
+    assert len(np.unique(gate_xy, axis=0)) == len(gate_list)
+
+
+def test_moves_keep_a_permutation_of_legal_sites(lists):
+    net_list, gate_list, pad_list = lists
+    moves = WindowedMoveGenerator(gate_list, rng=random.Random(1))
+    hpwl = IncrementalHPWL(net_list, gate_list, pad_list)
+    assert_legal(moves, gate_list)
+    assert moves.grid.free_slots >= 0.2 * len(gate_list)
+    for n in range(2000):
+        moves.propose(hpwl)
+        if n % 3:
+            moves.accept(hpwl)
+        else:
+            moves.reject(hpwl)
+    assert_legal(moves, gate_list)
+    assert hpwl.total == pytest.approx(summation_of_HPWL(net_list, gate_list, pad_list))
+
+
+def test_given_grid_is_used(lists):
+    net_list, gate_list, pad_list = lists
+    grid, displacement = legalize(gate_list, whitespace=0.3)
+    moves = WindowedMoveGenerator(gate_list, grid=grid)
+    assert moves.grid is grid
+    assert len(moves.slot_xy) == grid.columns * grid.rows
+    assert_legal(moves, gate_list)
+
+
+def test_legalize_and_refine_keeps_the_annealed_sites():
+    net_list, gate_list, pad_list = random_netlist(num_gates=200, num_nets=260)
+    moves = WindowedMoveGenerator(gate_list, rng=random.Random(1))
+    hpwl = IncrementalHPWL(net_list, gate_list, pad_list)
+    for n in range(2000):
+        moves.propose(hpwl)
+        moves.accept(hpwl)
+    annealed = gate_list[0].netlist.gate_xy.copy()
+    result = legalize_and_refine(net_list, gate_list, pad_list, passes=0)
+    assert result["displacement"] == 0
+    assert np.array_equal(result["grid"].occupant, moves.grid.occupant)
+    assert np.array_equal(gate_list[0].netlist.gate_xy, annealed)
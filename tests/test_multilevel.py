@@ -0,0 +1,35 @@
+import time
+
+import pytest
+
+from conftest import random_netlist
+from multilevel import multilevel_placement
+
+
+def test_time_budget_is_shared_between_the_levels():
+    budgets = []
+
+    # placers that use up their budget
+    def place(net_list, gate_list, pad_list, time_budget):
+        budgets.append(("place", len(gate_list), time_budget))
+        time.sleep(time_budget)
+
+    def refine(net_list, gate_list, pad_list, time_budget):
+        budgets.append(("refine", len(gate_list), time_budget))
+        time.sleep(time_budget)
+
+    lists = random_netlist(num_gates=400, num_nets=500)
+    result = multilevel_placement(*lists, place=place, refine=refine, min_gates=100, time_budget=0.8)
+    assert [gates for name, gates, budget in budgets] == result["gates"][::-1]
+    assert [name for name, gates, budget in budgets] == ["place"] + ["refine"] * (len(result["gates"]) - 1)
+    # half for the coarsest placement, the refinements share the rest
+    assert budgets[0][2] == pytest.approx(0.4, abs=0.05)
+    assert sum(budget for name, gates, budget in budgets) == pytest.approx(0.8, abs=0.1)
+    assert budgets[1][2] == pytest.approx(0.4 / (len(budgets) - 1), abs=0.05)
+
+
+def test_multilevel_SA_keeps_its_time_budget():
+    lists = random_netlist(num_gates=800, num_nets=1000)
+    start = time.monotonic()
+    multilevel_placement(*lists, place="SA", time_budget=1.0)
+    assert time.monotonic() - start < 2.0
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from conftest import random_netlist
+from data_structures import netlist_of
+from evaluations import summation_of_HPWL
+from netlist_store import INDEX_ARRAYS, open_store, write_store
+
+
+def test_store_round_trip(tmp_path):
+    net_list, gate_list, pad_list = random_netlist()
+    netlist = netlist_of(gate_list)
+    write_store(netlist, str(tmp_path))
+    stored = open_store(str(tmp_path), netlist.gate_xy)
+    for name in INDEX_ARRAYS + ("pad_xy", "gate_xy"):
+        assert np.array_equal(getattr(stored, name), getattr(netlist, name))
+    assert summation_of_HPWL(*stored.make_lists()) == pytest.approx(summation_of_HPWL(net_list, gate_list, pad_list))
+
+    # the connectivity is shared read-only, the coordinates are private
+    stored.gate_xy[0] = (1, 2)
+    assert not np.array_equal(stored.gate_xy[0], netlist.gate_xy[0])
+    stored_net_list, stored_gate_list, stored_pad_list = stored.make_lists()
+    with pytest.raises(ValueError, match="read-only"):
+        stored_gate_list[0].connected_cell_number = 3
+    gate_list[0].connected_cell_number = 3
+    assert netlist.connected_cell_number[0] == 3
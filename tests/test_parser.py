@@ -0,0 +1,87 @@
+import os
+import random
+
+import numpy as np
+import pytest
+
+import instrumentation
+from data_structures import netlist_of
+from parser import parse_netlist, parse_netlist_data, parser
+
+# 3 gates on 3 nets, pad 1 on net 1 and pad 2 on net 3
+BENCHMARK = b"""3 3
+1 2 1 2
+2 1 2
+3 2 2 3
+2
+1 1 0 50
+2 3 100 25
+"""
+
+
+@pytest.fixture
+def profiler():
+    yield instrumentation.enable()
+    instrumentation.disable()
+
+
+def write_benchmark(tmp_path, data=BENCHMARK):
+    path = tmp_path / "bench"
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_parser_builds_the_incidence(tmp_path):
+    net_list, gate_list, pad_list = parser(write_benchmark(tmp_path), cache=False)
+    assert [gate.connected_nets for gate in gate_list] == [[1, 2], [2], [2, 3]]
+    assert [net.connected_gates for net in net_list] == [[1], [1, 2, 3], [3]]
+    assert [net.connected_pad for net in net_list] == [[1], [], [2]]
+    assert [pad.connected_net for pad in pad_list] == [1, 3]
+    assert [pad.coordinate.tolist() for pad in pad_list] == [[0, 50], [100, 25]]
+    # gates and pads on the nets of every gate
+    assert [gate.connected_cell_number for gate in gate_list] == [5, 3, 5]
+
+
+def test_parser_keeps_the_random_placement_of_a_seed(tmp_path):
+    random.seed(1)
+    expected = [[random.randint(0, 1000) / 10, random.randint(0, 1000) / 10] for i in range(3)]
+    random.seed(1)
+    net_list, gate_list, pad_list = parser(write_benchmark(tmp_path), cache=False)
+    assert netlist_of(gate_list).gate_xy.tolist() == expected
+
+
+def test_cache_miss_then_hit(tmp_path, profiler):
+    filename = write_benchmark(tmp_path)
+    cache_dir = str(tmp_path / "cache")
+    first = parse_netlist(filename, cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+    assert profiler.counters.get("parse.cache_hits", 0) == 0
+
+    second = parse_netlist(filename, cache_dir=cache_dir)
+    assert profiler.counters["parse.cache_hits"] == 1
+    for name in ("gate_net_ptr", "gate_net_idx", "pad_net", "pad_xy", "net_pin_ptr", "net_pin_idx",
+                 "connected_cell_number"):
+        assert np.array_equal(getattr(first, name), getattr(second, name))
+
+    # another content is another cache entry
+    write_benchmark(tmp_path, BENCHMARK.replace(b"2 3 100 25", b"2 3 100 75"))
+    third = parse_netlist(filename, cache_dir=cache_dir)
+    assert profiler.counters["parse.cache_hits"] == 1
+    assert len(os.listdir(cache_dir)) == 2
+    assert third.pad_xy[1].tolist() == [100, 75]
+
+
+@pytest.mark.parametrize("data, message", [
+    (b"3 3\n1 2 1 x\n", "non numeric token"),
+    (b"3", "missing gate and net numbers"),
+    (b"3 3\n1 2 1 2\n2 1 2\n3 2", "file ends inside the gate records"),
+    (b"3 3\n1 2 1 2\n3 1 2\n2 2 2 3\n0\n", "gate IDs are not"),
+    (b"3 3\n1 2 1 2\n2 1 2\n3 2 2 3\n", "missing pad number"),
+    (b"3 3\n1 2 1 2\n2 1 2\n3 2 2 3\n2\n1 1 0 50\n", "expected 2 pad records"),
+    (b"3 3\n1 2 1 2\n2 1 2\n3 2 2 3\n2\n2 1 0 50\n1 3 100 25\n", "pad IDs are not"),
+    (b"3 3\n1 2 1 4\n2 1 2\n3 2 2 3\n0\n", "net IDs outside"),
+    (b"3 3\n1 2 1 2\n2 1 2\n3 2 2 3\n1\n1 0 0 50\n", "net IDs outside"),
+])
+def test_malformed_files_raise(data, message):
+    with pytest.raises(ValueError, match=message):
+        parse_netlist_data(data, "bench")
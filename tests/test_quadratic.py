@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from conftest import random_netlist
+from data_structures import netlist_of
+import Quadratic
+
+
+def dense_clique_solution(netlist):
+    # every pair of pins on a net is tied with weight 1, pads are fixed
+    A = np.zeros((netlist.num_gates, netlist.num_gates))
+    b = np.zeros((netlist.num_gates, 2))
+    for net in range(netlist.num_nets):
+        pins = netlist.net_pin_idx[netlist.net_pin_ptr[net]:netlist.net_pin_ptr[net + 1]].tolist()
+        for a in range(len(pins)):
+            for c in range(a + 1, len(pins)):
+                for u, v in ((pins[a], pins[c]), (pins[c], pins[a])):
+                    if u >= netlist.num_gates:
+                        continue
+                    A[u, u] += 1
+                    if v < netlist.num_gates:
+                        A[u, v] -= 1
+                    else:
+                        b[u] += netlist.xy[v]
+    return np.linalg.solve(A, b)
+
+
+@pytest.mark.parametrize("net_model", ["clique", "star", "hybrid"])
+def test_solve_matches_dense_clique_reference(net_model):
+    # a pad on every net, so that every connected component is anchored
+    net_list, gate_list, pad_list = random_netlist(num_gates=60, num_nets=80, max_net_gates=6, pad_net=range(80))
+    netlist = netlist_of(gate_list)
+    expected = dense_clique_solution(netlist)
+    Quadratic.solve(net_list, gate_list, pad_list, net_model=net_model)
+    assert np.allclose(netlist.gate_xy, expected, rtol=0, atol=1e-9)
@@ -0,0 +1,34 @@
+import math
+
+import numpy as np
+
+from repulsion import barnes_hut_repulsion, exact_repulsion, grid_repulsion
+
+
+def relative_errors(forces, exact):
+    total = np.linalg.norm(forces - exact) / np.linalg.norm(exact)
+    per_gate = np.median(np.linalg.norm(forces - exact, axis=1) / np.linalg.norm(exact, axis=1))
+    return total, per_gate
+
+
+def test_grid_repulsion_error_bound():
+    positions = np.random.default_rng(0).uniform(0, 100, (1000, 2))
+    exact = exact_repulsion(positions)
+    total, per_gate = relative_errors(grid_repulsion(positions), exact)
+    assert per_gate < 0.02
+    assert total < 0.12
+
+
+def test_grid_repulsion_error_falls_with_bins():
+    positions = np.random.default_rng(1).uniform(0, 100, (1000, 2))
+    exact = exact_repulsion(positions)
+    side = int(math.ceil(math.sqrt(len(positions))))
+    coarse = relative_errors(grid_repulsion(positions, side), exact)[1]
+    fine = relative_errors(grid_repulsion(positions, 4 * side), exact)[1]
+    assert fine < coarse / 2
+
+
+def test_barnes_hut_matches_exact():
+    positions = np.random.default_rng(2).uniform(0, 100, (2000, 2))
+    total, per_gate = relative_errors(barnes_hut_repulsion(positions, theta=0.5), exact_repulsion(positions))
+    assert per_gate < 0.02
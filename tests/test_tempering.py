@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+import instrumentation
+from conftest import random_netlist
+from evaluations import summation_of_HPWL
+from legalization import legalize
+from netlist_store import write_store
+import SA
+from SA import parallel_tempering
+
+
+@pytest.fixture
+def profiler():
+    yield instrumentation.enable()
+    instrumentation.disable()
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_tempering_returns_a_legal_placement(profiler, processes):
+    net_list, gate_list, pad_list = random_netlist()
+    gate_xy = gate_list[0].netlist.gate_xy
+    grid, displacement = legalize(gate_list)
+    legal_HPWL = summation_of_HPWL(net_list, gate_list, pad_list)
+    best_HPWL, stats = parallel_tempering(net_list, gate_list, pad_list, replicas=3, rounds=4, processes=processes,
+                                          grid=grid)
+
+    # every gate on its own site of the grid, and the grid knows it
+    occupied = np.nonzero(grid.occupant >= 0)[0]
+    assert sorted(grid.occupant[occupied].tolist()) == list(range(len(gate_list)))
+    assert np.array_equal(gate_xy[grid.occupant[occupied]], grid.slot_xy[occupied])
+    assert best_HPWL == pytest.approx(summation_of_HPWL(net_list, gate_list, pad_list))
+    assert best_HPWL <= legal_HPWL
+
+    assert len(profiler.series["PT"]) == 4
+    assert profiler.counters["PT.moves"] == sum(replica["moves"] for replica in stats) == 3 * 4 * 2 * len(gate_list)
+    assert profiler.counters["PT.accepted"] == sum(replica["accepted"] for replica in stats)
+    assert profiler.counters["PT.exchanges_tried"] == 4
+
+
+def test_workers_map_the_netlist_store(tmp_path):
+    net_list, gate_list, pad_list = random_netlist()
+    netlist = gate_list[0].netlist
+    write_store(netlist, str(tmp_path))
+    SA._init_replica_worker(str(tmp_path), netlist.gate_xy, 8, 8, (0, 0), (100, 100))
+    try:
+        worker_netlist = SA._replica[0][1][0].netlist
+        assert isinstance(worker_netlist.net_pin_idx, np.memmap)
+        assert not worker_netlist.gate_net_idx.flags.writeable
+        assert worker_netlist.gate_xy.flags.writeable
+    finally:
+        SA._replica = None
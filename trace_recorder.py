@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+
+
+class TraceRecorder:
+    # records every stride-th row of the given columns (e.g. the HPWL after every SA move) into a preallocated buffer.
+    #   path given:   the buffer is a chunk of capacity rows appended to the file whenever it fills and on flush(),
+    #                 as CSV (one header line, read back by visualization.draw_graph_array) or, with binary=True,
+    #                 as raw float64 rows (np.fromfile(path).reshape(-1, len(columns)))
+    #   ring=True:    only the last capacity rows are kept
+    #   otherwise:    every row is kept, the buffer doubles when it fills
+    # append=True continues an existing file instead of starting a new one, e.g. for a resumed anneal
+    def __init__(self, columns=("HPWL",), stride=1, capacity=65536, ring=False, path=None, binary=False,
+                 append=False):
+        self.columns = tuple(columns)
+        self.stride = max(1, int(stride))
+        self.ring = ring
+        self.path = path
+        self.binary = binary
+        self.buffer = np.empty((capacity, len(self.columns)), dtype=np.float64)
+        self.size = 0  # rows in the buffer
+        self.start = 0  # oldest row of a full ring
+        self.calls = 0
+        self.samples = 0
+        if path is not None and not (append and os.path.exists(path)):
+            with open(path, "w") as file:
+                if not binary:
+                    file.write(",".join(self.columns) + "\n")
+
+    def record(self, *values):
+        self.calls += 1
+        if (self.calls - 1) % self.stride:
+            return
+        self.samples += 1
+        capacity = len(self.buffer)
+        if self.size == capacity:
+            if self.path is not None:
+                self.flush()
+            elif self.ring:
+                self.buffer[self.start] = values
+                self.start = (self.start + 1) % capacity
+                return
+            else:
+                self.buffer = np.concatenate((self.buffer, np.empty_like(self.buffer)))
+        self.buffer[self.size] = values
+        self.size += 1
+
+    def flush(self):
+        # appends the buffered rows to the file
+        if self.path is None or self.size == 0:
+            return
+        with open(self.path, "ab") as file:
+            if self.binary:
+                self.buffer[:self.size].tofile(file)
+            else:
+                np.savetxt(file, self.buffer[:self.size], delimiter=",", fmt="%.17g")
+        self.size = 0
+
+    def array(self):
+        # the recorded rows, oldest first: the whole file with a path, the rows in memory otherwise
+        if self.path is not None:
+            self.flush()
+            if self.binary:
+                return np.fromfile(self.path, dtype=np.float64).reshape(-1, len(self.columns))
+            return np.loadtxt(self.path, delimiter=",", skiprows=1, ndmin=2)
+        return np.roll(self.buffer[:self.size], -self.start, axis=0)
+
+    def close(self):
+        self.flush()
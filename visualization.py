@@ -5,20 +5,42 @@ import data_structures
 import random
 import parser
 import save_gif
+from net_models import segment_members, star_positions
+import instrumentation
 
-pygame.init()
 BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
 BLUE = (0, 0, 255)
 GREEN = (0, 255, 0)
 RED = (255, 0, 0)
 size = [1000, 1000]
-screen = pygame.display.set_mode(size)
-clock = pygame.time.Clock()
+# the window is only opened by the first drawing, importing this module does not touch the display
+screen = None
+clock = None
+font = None
 
 net_colors = []
 
 
+def init_display():
+    global screen, clock
+    if screen is None:
+        pygame.init()
+        screen = pygame.display.set_mode(size)
+        clock = pygame.time.Clock()
+    return screen
+
+
+def renderer(ver="", path="", animation_save=0, frames=None, max_net_pins=100):
+    # observer for the placers: draws every placement they report with draw_window.
+    # frames, a frame_pipeline.FrameWriter, receives the animation frames instead of PNG snapshots
+    def observe(net_list, gate_list, pad_list, remark=0, information=[]):
+        draw_window(pad_list, gate_list, net_list, remark=remark, animation_save=animation_save, path=path, ver=ver,
+                    information=information, frames=frames, max_net_pins=max_net_pins)
+
+    return observe
+
+
 def set_net_colors(net_list):
     for i in range(len(net_list)):
         # net_iter: data_structures.Net = net_list[i]
@@ -45,13 +67,17 @@ def print_pads_and_gates(pad_list, gate_list, remark):
     plt.show()
 
 
-def pygame_quit(save_image=0, FD=1):
-    if save_image:
+def pygame_quit(save_image=0, FD=1, frames=None):
+    if frames is not None:
+        # the animation was streamed, only the writer has to finish
+        frames.close()
+    elif save_image:
         if FD:
             save_gif.save_gif()
         pass
 
-    pygame.quit()
+    if screen is not None:
+        pygame.quit()
 
 
 def draw_graph_array(ndarray=[], csv_name="", title="HPWL", graph_name="graph.png"):
@@ -69,91 +95,63 @@ def draw_graph_array(ndarray=[], csv_name="", title="HPWL", graph_name="graph.pn
     plt.savefig(graph_name)
 
 
-def draw_window(pad_list, gate_list, net_list, remark=0, initial_display=0, animation_save=0, path="", ver="",
-                information=[]):
-    # get the coordinates and scale that.
-    gate_coordinates = []
-    pad_coordinates = []
+def stamp_disks(surface, centers, radius, color):
+    # filled disks at all the centers at once, written into the pixel array of the surface
+    offsets = np.array([(dx, dy) for dx in range(-radius, radius + 1) for dy in range(-radius, radius + 1)
+                        if dx * dx + dy * dy <= radius * radius])
+    points = (centers[:, None, :] + offsets[None, :, :]).reshape(-1, 2)
+    width, height = surface.get_size()
+    points = points[(points[:, 0] >= 0) & (points[:, 0] < width) & (points[:, 1] >= 0) & (points[:, 1] < height)]
+    surface_pixels = pygame.surfarray.pixels3d(surface)
+    surface_pixels[points[:, 0], points[:, 1]] = color
+    # the surface stays locked while the pixel array lives
+    del surface_pixels
 
-    for i in range(len(gate_list)):
-        gate_i: data_structures.Gate = gate_list[i]
-        gate_coordinate = [int(gate_i.coordinate[0] * 10), int(gate_i.coordinate[1] * 10)]
-        gate_coordinates.append(gate_coordinate)
-    for i in range(len(pad_list)):
-        pad_i: data_structures.Pad = pad_list[i]
-        pad_coordinate = [int(pad_i.coordinate[0] * 10), int(pad_i.coordinate[1] * 10)]
-        pad_coordinates.append(pad_coordinate)
 
-    # get the net centers
-    net_centers = []
-    for i in range(len(net_list)):
-        net_i: data_structures.Net = net_list[i]
-        connected_gate_num = len(net_i.connected_gates)
-        x_center = 0
-        y_center = 0
-        for j in range(connected_gate_num):
-            gate_i = gate_list[net_i.connected_gates[j] - 1]
-            x_center += gate_i.coordinate[0]
-            y_center += gate_i.coordinate[1]
-
-        connected_pad_num = len(net_i.connected_pad)
-        for j in range(connected_pad_num):
-            pad_i = pad_list[net_i.connected_pad[j] - 1]
-            x_center += pad_i.coordinate[0]
-            y_center += pad_i.coordinate[1]
-
-        x_center = x_center / (connected_gate_num + connected_pad_num)
-        y_center = y_center / (connected_gate_num + connected_pad_num)
-
-        # scale
-        x_center = int(x_center * 10)
-        y_center = int(y_center * 10)
-        net_center = [x_center, y_center]
-        net_centers.append(net_center)
-
-    # get the net line coordinates
-    gate_coordinates_for_nets = []
-    pad_coordinates_for_nets = []
+def label_font():
+    global font
+    if font is None:
+        font = pygame.font.SysFont("arial", 100, True, False)
+    return font
 
-    for i in range(len(net_list)):
-        net_i: data_structures.Net = net_list[i]
-        connected_gate_num = len(net_i.connected_gates)
-        gate_coordinates_for_net_i = []
-        for j in range(connected_gate_num):
-            gate_i: data_structures.Gate = gate_list[net_i.connected_gates[j] - 1]
-            gate_coordinate = [int(gate_i.coordinate[0] * 10), int(gate_i.coordinate[1] * 10)]  # scaled gate coordinate
-            gate_coordinates_for_net_i.append(gate_coordinate)
-        gate_coordinates_for_nets.append(gate_coordinates_for_net_i)
-
-        connected_pad_num = len(net_i.connected_pad)
-        pad_coordinates_for_net_i = []
-        for j in range(connected_pad_num):
-            pad_i: data_structures.Pad = pad_list[net_i.connected_pad[j] - 1]
-            pad_coordinate = [int(pad_i.coordinate[0] * 10), int(pad_i.coordinate[1] * 10)]  # scaled coordinate
-            pad_coordinates_for_net_i.append(pad_coordinate)
-        pad_coordinates_for_nets.append(pad_coordinates_for_net_i)
-
-    # delete the completely used variables
-    del gate_coordinates_for_net_i, gate_coordinate, connected_gate_num, gate_i, i, j, net_center, x_center, y_center
 
+def draw_window(pad_list, gate_list, net_list, remark=0, initial_display=0, animation_save=0, path="", ver="",
+                information=[], frames=None, max_net_pins=100):
+    with instrumentation.get_profiler().timer("render"):
+        _draw_window(pad_list, gate_list, net_list, remark, animation_save, path, ver, information, frames,
+                     max_net_pins)
+
+
+def _draw_window(pad_list, gate_list, net_list, remark, animation_save, path, ver, information, frames,
+                 max_net_pins):
+    # the geometry comes straight from the coordinate buffer, scaled to pixels
+    netlist = data_structures.netlist_of(gate_list)
+    pixels = (netlist.xy * 10).astype(np.int64)
+    pin_count = np.diff(netlist.net_pin_ptr)
+
+    # net centers as the mean of all pins, nets with more than max_net_pins pins are not drawn
+    nets = np.nonzero((pin_count > 0) if max_net_pins is None else (pin_count > 0) & (pin_count <= max_net_pins))[0]
+    net_centers = (star_positions(netlist, nets) * 10).astype(np.int64)
+
+    # every net is one polyline center, pin 1, center, pin 2, ... instead of one line per pin
+    owners, positions = segment_members(netlist.net_pin_ptr[nets], pin_count[nets])
+    star_points = np.empty((2 * len(owners), 2), dtype=np.int64)
+    star_points[0::2] = net_centers[owners]
+    star_points[1::2] = pixels[netlist.net_pin_idx[positions]]
+    polylines = np.split(star_points, 2 * np.cumsum(pin_count[nets])[:-1]) if len(nets) else []
+
+    init_display()
     # for times in range(len(net_list)):
     for times in range(1):
         # print(times)
         clock.tick(100)
         screen.fill(WHITE)
 
-        for i in range(len(net_list)):
-            gate_coordinates_for_net_i = gate_coordinates_for_nets[i]
-            pad_coordinates_for_net_i = pad_coordinates_for_nets[i]
-            for j in range(len(gate_coordinates_for_net_i)):
-                pygame.draw.line(screen, RED, net_centers[i], gate_coordinates_for_net_i[j])
-            for j in range(len(pad_coordinates_for_net_i)):
-                pygame.draw.line(screen, RED, net_centers[i], pad_coordinates_for_net_i[j])
+        for points in polylines:
+            pygame.draw.lines(screen, RED, False, points.tolist())
 
-        for i in range(len(gate_list)):
-            pygame.draw.circle(screen, BLACK, gate_coordinates[i], 3)
-        for i in range(len(pad_list)):
-            pygame.draw.circle(screen, BLUE, pad_coordinates[i], 5)
+        stamp_disks(screen, pixels[:netlist.num_gates], 3, BLACK)
+        stamp_disks(screen, pixels[netlist.num_gates:], 5, BLUE)
 
         if ver == "visualization":
             filename = "%04d.png" % remark
@@ -161,20 +159,23 @@ def draw_window(pad_list, gate_list, net_list, remark=0, initial_display=0, anim
         if ver == "SA":
             T = information[0]
             HPWL = information[1]
-            myFont = pygame.font.SysFont("arial", 100, True, False)
+            myFont = label_font()
             T_text = myFont.render("T: " + str(round(T, 2)), True, BLACK)
             HPWL_text = myFont.render("HPWL: " + str(int(HPWL)), True, BLACK)
             screen.blit(T_text, [10, 30])
             screen.blit(HPWL_text, [10, 130])
-            filename = "Images_SA/Snaps/%05d.png" % remark
-            pygame.image.save(screen, filename)
+            if frames is not None:
+                frames.submit(screen)
+            else:
+                filename = "Images_SA/Snaps/%05d.png" % remark
+                pygame.image.save(screen, filename)
         elif ver == "FD1":
             pygame.image.save(screen, "FD_images/" + "initial" + ".png")
         elif ver == "FD2":
             pygame.image.save(screen, "FD_images/" + "final" + ".png")
 
         elif ver == "FD3":
-            myFont = pygame.font.SysFont("arial", 100, True, False)
+            myFont = label_font()
             remark_text = myFont.render("N: " + str(remark), True, BLACK)
             screen.blit(remark_text, [10, 30])
             pygame.image.save(screen, "FD_images/result" + str(remark) + ".png")
@@ -187,6 +188,9 @@ def draw_window(pad_list, gate_list, net_list, remark=0, initial_display=0, anim
         elif ver == "Q":
             pygame.image.save(screen, "Images_Q/" + information[0] + ".png")
             print(".")
+        elif frames is not None:
+            frames.submit(screen)
+            pygame.display.flip()
         elif animation_save:
             filename = path + "/Snaps/%04d.png" % remark
             pygame.image.save(screen, filename)